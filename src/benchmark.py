@@ -0,0 +1,286 @@
+"""Benchmarks of the performance sensitive parts of the Kamlbot.
+
+Run from the root of the repository with
+
+    python src/benchmark.py [benchmark name ...]
+
+All benchmarks are run if no name is given. They use synthetic game
+histories, so no data file is needed.
+"""
+import io
+import numpy as np
+import random
+import os
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from difflib import get_close_matches
+
+from identity import IdentityManager
+from ranking import ranking_types
+from save_and_load import (binary_game_logs, game_results_writer,
+                           iter_saved_games, write_games)
+from search_index import TrigramIndex
+
+
+def synthetic_games(n_games, n_players, seed=0):
+    """Generate a random game history."""
+    rng = random.Random(seed)
+    aliases = [f"Player {k}" for k in range(n_players)]
+    games = []
+
+    for k in range(n_games):
+        winner, loser = rng.sample(aliases, 2)
+        games.append(dict(timestamp=1.5e9 + 60*k,
+                          id=10**17 + k,
+                          winner=winner,
+                          loser=loser))
+
+    return games
+
+
+def timed(func, *args, **kwargs):
+    """Call the function and return its result and the time it took."""
+    start = time.perf_counter()
+    res = func(*args, **kwargs)
+    return res, time.perf_counter() - start
+
+
+def new_ranking(ranking_type="trueskill", **kwargs):
+    return ranking_types[ranking_type]("benchmark", IdentityManager(),
+                                       mingames=20, **kwargs)
+
+
+def bench_replay(n_games=20000, n_players=1000):
+    """Compare `register_game` called for each game with `replay`."""
+    games = synthetic_games(n_games, n_players)
+
+    print(f"{n_games} games, {n_players} players")
+
+    for ranking_type in ["trueskill", "vectorized_trueskill", "eel", "duchu"]:
+        def register_all(ranking):
+            for game in games:
+                ranking.register_game(game)
+
+        _, dt_register = timed(register_all, new_ranking(ranking_type))
+        _, dt_replay = timed(new_ranking(ranking_type).replay, games)
+
+        print(f"    {ranking_type:<20} register_game {dt_register:8.2f} s"
+              f"    replay {dt_replay:8.2f} s")
+
+
+def object_size(obj):
+    """Size in memory of an object and of its attribute dict, if any."""
+    size = sys.getsizeof(obj)
+
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+
+    return size
+
+
+def bench_aliases(n_games=20000, n_aliases=20000):
+    """Replay time with many aliases, with the alias index of the identity
+    manager and with the list of aliases it used to have.
+    """
+    games = synthetic_games(n_games, n_aliases)
+
+    class ListIdentityManager(IdentityManager):
+        def __init__(self):
+            super().__init__()
+            self.alias_list = []
+
+        @property
+        def aliases(self):
+            return self.alias_list
+
+        def add_identity(self, discord_id=None, aliases=set()):
+            self.alias_list.extend(aliases)
+            return super().add_identity(discord_id, aliases)
+
+    print(f"{n_games} games, {n_aliases} aliases")
+
+    for name, manager_type in [("list", ListIdentityManager),
+                               ("index", IdentityManager)]:
+        ranking = ranking_types["eel"]("benchmark", manager_type(), mingames=20)
+        _, dt = timed(ranking.replay, games)
+        print(f"    {name:<6} replay {dt:8.2f} s"
+              f"    ({len(ranking.identity_manager.aliases)} aliases)")
+
+
+def bench_allocation(n_games=20000, n_players=1000):
+    """Memory used while replaying a large history, and size of the state
+    objects, that are created for each game, with and without slots.
+    """
+    games = synthetic_games(n_games, n_players)
+
+    class DictState:
+        pass
+
+    print(f"{n_games} games, {n_players} players")
+
+    for ranking_type in ["trueskill", "eel", "duchu"]:
+        ranking = new_ranking(ranking_type)
+
+        tracemalloc.start()
+        ranking.replay(games)
+        used, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        state = ranking.initial_player_state()
+        dict_state = DictState()
+        dict_state.__dict__.update(state.asdict())
+
+        print(f"    {ranking_type:<10} memory {used/n_games:6.0f} B/game"
+              f"    peak {peak/1e6:7.2f} MB"
+              f"    state {object_size(state)} B"
+              f" (with __dict__ {object_size(dict_state)} B)")
+
+
+def bench_game_log(n_games=200000, n_players=1000):
+    """Time to read the full game log with each storage backend."""
+    games = synthetic_games(n_games, n_players)
+    files = dict(binary=["raw_results.bin", "raw_results_aliases.txt"],
+                 csv=["raw_results.csv"])
+    cwd = os.getcwd()
+
+    print(f"{n_games} games, {n_players} players")
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        os.makedirs("data")
+
+        try:
+            # The binary log is written first, otherwise it would be
+            # migrated from the CSV log when opened
+            for backend in ["binary", "csv"]:
+                if backend == "csv":
+                    with open("data/raw_results.csv", "w", encoding="utf-8",
+                              newline="") as file:
+                        game_results_writer(file).writeheader()
+
+                write_games(games, backend=backend)
+                n_read, dt = timed(lambda: sum(1 for _ in iter_saved_games(backend)))
+                size = sum(os.path.getsize(os.path.join("data", name))
+                           for name in files[backend])
+
+                print(f"    {backend:<10} read {dt:8.2f} s"
+                      f"    ({n_read/dt:10.0f} games/s)"
+                      f"    size {size/1e6:8.2f} MB")
+        finally:
+            binary_game_logs.clear()
+            os.chdir(cwd)
+
+
+def bench_persistence(n_games=50000, n_players=1000):
+    """Write and read throughput of the ranking checkpoints."""
+    games = synthetic_games(n_games, n_players)
+    ranking = new_ranking("eel")
+    ranking.replay(games)
+
+    buffer = io.BytesIO()
+    _, dt_write = timed(ranking.dump_state, buffer)
+    size = len(buffer.getvalue())
+
+    buffer.seek(0)
+    _, dt_read = timed(new_ranking("eel").load_state, buffer)
+
+    n_states = sum(len(player.history) for player in ranking.players)
+
+    print(f"{n_games} games, {n_players} players, {n_states} states")
+    print(f"    size  {size/1e6:8.2f} MB")
+    print(f"    write {dt_write:8.2f} s  ({n_states/dt_write:10.0f} states/s)")
+    print(f"    read  {dt_read:8.2f} s  ({n_states/dt_read:10.0f} states/s)")
+
+
+def bench_search(sizes=(10000, 100000, 1000000), n_queries=20):
+    """Compare `difflib.get_close_matches` with the trigram index for the
+    fuzzy search of aliases, with queries that are misspelled aliases.
+    """
+    rng = random.Random(0)
+
+    for size in sizes:
+        aliases = list({"".join(rng.choices(string.ascii_letters,
+                                            k=rng.randint(4, 12)))
+                        for _ in range(size)})
+        queries = []
+
+        for alias in rng.sample(aliases, n_queries):
+            k = rng.randrange(len(alias))
+            queries.append(alias[:k] + rng.choice(string.ascii_letters)
+                           + alias[k + 1:])
+
+        index, dt_build = timed(TrigramIndex, aliases)
+
+        found, dt_index = timed(lambda: [index.search(query)
+                                         for query in queries])
+        expected, dt_difflib = timed(lambda: [get_close_matches(query, aliases,
+                                                                n=5)
+                                              for query in queries])
+
+        same_best = sum(f[:1] == e[:1] for f, e in zip(found, expected))
+
+        print(f"{len(aliases)} aliases, {n_queries} queries")
+        print(f"    build index {dt_build:8.2f} s")
+        print(f"    difflib     {1000*dt_difflib/n_queries:8.2f} ms/query"
+              f"    index {1000*dt_index/n_queries:8.2f} ms/query")
+        print(f"    same best match for {same_best}/{n_queries} queries")
+
+
+def bench_trueskill(n_games=20000, n_players=1000):
+    """Compare the `trueskill` package with the vectorized TrueSkill
+    ranking, and check that they give the same ratings.
+    """
+    games = synthetic_games(n_games, n_players)
+    reference = new_ranking("trueskill")
+    vectorized = new_ranking("vectorized_trueskill")
+
+    _, dt_reference = timed(reference.replay, games)
+    _, dt_vectorized = timed(vectorized.replay, games)
+
+    pairs = [(reference.alias_to_player[alias], vectorized.alias_to_player[alias])
+             for alias in reference.identity_manager.aliases]
+    dmu = max(abs(p1.mu - p2.mu) for p1, p2 in pairs)
+    dsigma = max(abs(p1.sigma - p2.sigma) for p1, p2 in pairs)
+
+    # Rating only, without the bookkeeping of the ranking
+    ids = np.array([(vectorized.alias_to_player[game["winner"]].id,
+                     vectorized.alias_to_player[game["loser"]].id)
+                    for game in games])
+    ratings = [reference.ts_env.Rating() for _ in range(n_players)]
+
+    def rate_all():
+        for w, l in ids.tolist():
+            ratings[w], ratings[l] = reference.ts_env.rate_1vs1(ratings[w],
+                                                                ratings[l])
+
+    vectorized.reset()
+    _, dt_rate_reference = timed(rate_all)
+    _, dt_rate_vectorized = timed(vectorized.rate_games, ids[:, 0], ids[:, 1])
+
+    print(f"{n_games} games, {n_players} players")
+    print(f"    replay trueskill  {dt_reference:8.2f} s"
+          f"    vectorized {dt_vectorized:8.2f} s")
+    print(f"    rating trueskill  {dt_rate_reference:8.2f} s"
+          f"    vectorized {dt_rate_vectorized:8.2f} s")
+    print(f"    max difference    mu {dmu:.2e}    sigma {dsigma:.2e}")
+
+
+benchmarks = dict(aliases=bench_aliases,
+                  allocation=bench_allocation,
+                  game_log=bench_game_log,
+                  replay=bench_replay,
+                  persistence=bench_persistence,
+                  search=bench_search,
+                  trueskill=bench_trueskill)
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(benchmarks)
+
+    for name in names:
+        print(f"## {name}")
+        benchmarks[name]()
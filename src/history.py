@@ -0,0 +1,59 @@
+import numpy as np
+
+
+NO_VALUE = np.iinfo(np.int32).min  # Value representing `None` in saved ranks
+
+
+def history_dtype(state_type):
+    """NumPy type of the rows of the history of players with states of the
+    given type.
+    """
+    fields = dict(dict(game="i8", time="f8", score="f8", rank="i4"),
+                  **state_type.fields)
+    return np.dtype(list(fields.items()))
+
+
+class History:
+    """History of the states of a player, with one row per game played.
+
+    Rows are stored in a growable NumPy structured array, and the columns
+    are accessed as views of it, e.g. `history["score"]`.
+
+    Each row contains the index of the game in the game log (`game`), its
+    timestamp (`time`), the score of the player and the other fields of the
+    state of the player after the game. The rank is the one right after the
+    game, or `NO_VALUE` if the player was not ranked.
+    """
+    def __init__(self, dtype):
+        self.records = np.zeros(8, dtype=dtype)
+        self.size = 0
+
+    def __getitem__(self, field):
+        return self.records[field][:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def append(self, values):
+        """Add a row given as a dict of the values of each field."""
+        if self.size == len(self.records):
+            records = np.zeros(max(8, 2*self.size), dtype=self.records.dtype)
+            records[:self.size] = self.records
+            self.records = records
+
+        self.records[self.size] = tuple(values[name]
+                                        for name in self.records.dtype.names)
+        self.size += 1
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Create a history containing a copy of the given rows."""
+        history = cls(rows.dtype)
+        history.records = np.array(rows)
+        history.size = len(rows)
+        return history
+
+    @property
+    def rows(self):
+        """View of the filled part of the history."""
+        return self.records[:self.size]
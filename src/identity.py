@@ -1,9 +1,11 @@
-from wcwidth import wcswidth, wcwidth
+import asyncio
+import json
 
-from itertools import chain
+from wcwidth import wcswidth, wcwidth
 
 from save_and_load import clean_name
-from utils import logger
+from search_index import TrigramIndex, WordTrie
+from utils import emit_signal, logger
 
 
 class AliasTakenError(Exception):
@@ -14,6 +16,56 @@ class AliasTakenError(Exception):
         return f"Aliases {self.taken} are already claimed by other players."
 
 
+def fixed_width(text, width_size=20):
+    """Cut or pad the text so that it is displayed with a fixed width.
+
+    Text with mostly double width characters gets a width of
+    `width_size + 2` and is padded with ideographic spaces.
+    """
+    text_len = wcswidth(text)
+
+    one_space_count = 0
+    two_space_count = 0
+    for char in text:
+        char_len = wcwidth(char)
+        if char_len == 1:
+            one_space_count += 1
+        elif char_len == 2:
+            two_space_count += 1
+    is_asian = two_space_count > one_space_count
+
+    if is_asian:  # must be width_size + 2 wide
+        if text_len > (width_size + 2):  # add characters until width_size + 2
+            current_len = 0
+            formatted_text = u""
+            for char in text:
+                formatted_text += char
+                current_len += wcwidth(char)
+                if current_len == (width_size + 2):
+                    break
+                elif current_len == (width_size + 3):
+                    formatted_text = formatted_text[:-1] + u" "
+                    break
+            return formatted_text
+        elif text_len < (width_size + 2):  # add ideographic spaces (　) until width_size + 2 or + 1
+            current_len = text_len
+            formatted_text = text
+            while current_len != (width_size + 2):
+                formatted_text += u"　"
+                current_len += 2
+                if current_len == (width_size + 3):
+                    formatted_text = formatted_text[:-1] + u" "
+                    break
+            return formatted_text
+    elif not is_asian:  # must be width_size wide
+        if text_len > width_size:
+            return text[:width_size]
+        elif text_len < width_size:
+            return text + u" " * (width_size - text_len)
+
+    return text
+
+
 class Identity:
     """Class used to uniquely identify a player.
 
@@ -23,6 +75,7 @@ class Identity:
     discord_id = None
     aliases = None
     _display_name = None
+    _fixed_width_names = None  # Display name and its fixed width versions
 
     def __init__(self, discord_id, aliases):
         self.discord_id = discord_id
@@ -50,52 +103,26 @@ class Identity:
     def display_name(self, name):
         self._display_name = name
 
+    def fixed_width_name(self, width_size=20):
+        """Display name cut or padded to a fixed width.
+
+        Cached until the display name changes.
+        """
+        name = self.display_name
+
+        if self._fixed_width_names is None or self._fixed_width_names[0] != name:
+            self._fixed_width_names = (name, {})
+
+        cache = self._fixed_width_names[1]
+
+        if width_size not in cache:
+            cache[width_size] = fixed_width(name, width_size)
+
+        return cache[width_size]
+
     @property
     def leaderboard_name(self):
-        text = self.display_name
-        text_len = wcswidth(self.display_name)
-
-        one_space_count = 0
-        two_space_count = 0
-        for char in text:
-            char_len = wcwidth(char)
-            if char_len == 1:
-                one_space_count += 1
-            elif char_len == 2:
-                two_space_count += 1
-        is_asian = two_space_count > one_space_count
-
-        width_size = 20
-        if is_asian:  # must be 22 width (width_size + 2)
-            if text_len > (width_size + 2):  # add characters until 22
-                current_len = 0
-                formatted_text = u""
-                for char in text:
-                    formatted_text += char
-                    current_len += wcwidth(char)
-                    if current_len == (width_size + 2):
-                        break
-                    elif current_len == (width_size + 3):
-                        formatted_text = formatted_text[:-1] + u" "
-                        break
-                return formatted_text
-            elif text_len < (width_size + 2):  # add ideographic space (　) until 22 or 21
-                current_len = text_len
-                formatted_text = text
-                while current_len != (width_size + 2):
-                    formatted_text += u"　"
-                    current_len += 2
-                    if current_len == (width_size + 3):
-                        formatted_text = formatted_text[:-1] + u" "
-                        break
-                return formatted_text
-        elif not is_asian:  # must be 20 width
-            if text_len > width_size:
-                return text[:width_size]
-            elif text_len < width_size:
-                return text + u" " * (width_size - text_len)
-            else:
-                return text
+        return self.fixed_width_name(20)
 
     @property
     def is_claimed(self):
@@ -104,11 +131,23 @@ class Identity:
 
 class IdentityManager:
     def __init__(self):
+        # Dicts keep insertion order, so the aliases are in the order in
+        # which they were added
         self.alias_to_identity = {}
-        self.alias_to_identity_keys = []
         self.discord_id_to_identity = {}
         self.identities = set()
 
+        # Claimed identities by display name, and the display name under
+        # which each of them is indexed
+        self.discord_name_to_identity = {}
+        self.indexed_names = {}
+
+        # Aliases and display names, for fuzzy search
+        self.search_index = TrigramIndex()
+
+        # Aliases by words, to split names given in several parts
+        self.alias_trie = WordTrie()
+
     def __getitem__(self, searchkey):
         try:
             if type(searchkey) == str:
@@ -129,7 +168,19 @@ class IdentityManager:
 
     @property
     def aliases(self):
-        return self.alias_to_identity_keys
+        """Set-like view of all aliases, in the order they were added."""
+        return self.alias_to_identity.keys()
+
+    def add_alias(self, identity, alias):
+        """Associate an existing alias to a claimed identity.
+
+        The identity previously associated to the alias loses all its
+        aliases.
+        """
+        self.alias_to_identity[alias].aliases = set()
+        identity.aliases.add(alias)
+        self.alias_to_identity[alias] = identity
+        self.index_display_name(identity)
 
     def add_identity(self, discord_id=None, aliases=set()):
         identity = Identity(discord_id, aliases)
@@ -137,28 +188,60 @@ class IdentityManager:
 
         for alias in aliases:
             self.alias_to_identity[alias] = identity
-            self.alias_to_identity_keys.append(alias)
+            self.search_index.add(alias)
+            self.alias_trie.add(alias)
 
         if discord_id is not None:
-            self.discord_id_to_identity[discord_id] = identity
+            self.claim(identity, discord_id)
 
         return identity
 
-    @property
-    def claimed_aliases(self):
-        return list(chain.from_iterable([identity.aliases for identity
-                                         in self.claimed_identities]))
+    def claim(self, identity, discord_id):
+        """Associate an identity to a discord user."""
+        identity.discord_id = discord_id
+        self.discord_id_to_identity[discord_id] = identity
+        self.index_display_name(identity)
 
     @property
     def claimed_identities(self):
-        return [identity for identity in self.identities if identity.is_claimed]
+        return list(self.discord_id_to_identity.values())
 
-    @property
-    def discord_name_to_identity(self):
-        return {iden.display_name: iden for iden in self.claimed_identities}
+    def index_display_name(self, identity):
+        """Update the display name under which a claimed identity can be
+        found.
+        """
+        old_name = self.indexed_names.get(identity)
+
+        if self.discord_name_to_identity.get(old_name) is identity:
+            del self.discord_name_to_identity[old_name]
+
+            if old_name not in self.alias_to_identity:
+                self.search_index.remove(old_name)
+
+        self.indexed_names[identity] = identity.display_name
+        self.discord_name_to_identity[identity.display_name] = identity
+        self.search_index.add(identity.display_name)
 
     def is_claimed(self, alias):
-        return alias in self.claimed_aliases
+        identity = self.alias_to_identity.get(alias)
+        return (identity is not None and identity.is_claimed
+                and alias in identity.aliases)
+
+    def search(self, name, n=5):
+        """Return up to `n` aliases or display names close to the given
+        name, from the closest.
+        """
+        return self.search_index.search(name, n=n)
+
+    def set_display_name(self, identity, name):
+        identity.display_name = name
+        self.index_display_name(identity)
+
+    def split_aliases(self, words, n, limit=None):
+        """Return the ways to split the words in `n` aliases, as lists of
+        aliases, up to `limit` of them.
+        """
+        return self.alias_trie.segmentations(words, n, limit=limit)
 
     def load_data(self):
         logger.info("Building PlayerManager.")
@@ -180,6 +263,24 @@ class IdentityManager:
         except FileNotFoundError:
             logger.warning("No saved alias table found.")
 
+    def load_display_names(self, path="data/display_names.json"):
+        """Set the last known display names of the claimed identities, saved
+        with `save_display_names`.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                display_names = json.load(file)
+
+        except FileNotFoundError:
+            logger.warning("No saved display names found.")
+            return
+
+        for discord_id, name in display_names.items():
+            identity = self.discord_id_to_identity.get(int(discord_id))
+
+            if identity is not None:
+                self.set_display_name(identity, name)
+
     def save_data(self):
         logger.info("Aliases file overriden.")
 
@@ -188,6 +289,101 @@ class IdentityManager:
                 aliases = [clean_name(alias) for alias in identity.aliases]
                 file.write('{},{}\n'.format(discord_id, ','.join(aliases)))
 
+    def save_display_names(self, path="data/display_names.json"):
+        display_names = {discord_id: identity._display_name
+                         for discord_id, identity
+                         in self.discord_id_to_identity.items()
+                         if identity._display_name is not None}
+
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(display_names, file, ensure_ascii=False, indent=0)
+
+
+class DisplayNameUpdater:
+    """Refresh the display names of the claimed identities from Discord.
+
+    Users are fetched with `client.fetch_user`, at most `concurrency` at
+    once, and the display names are saved to disk after each refresh so
+    that they are known right away at the next start. Once started, all
+    display names are refreshed every `interval` seconds in the background.
+
+    The signal `display_names_updated` is emitted when names changed.
+    """
+    def __init__(self, identity_manager, client,
+                 concurrency=10, interval=6*3600, path="data/display_names.json"):
+        self.identity_manager = identity_manager
+        self.client = client
+        self.concurrency = concurrency
+        self.interval = interval
+        self.path = path
+        self.task = None
+
+    async def close(self):
+        """Stop the background refresh."""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def fetch_display_name(self, identity, semaphore):
+        """Return the current display name of the identity, or `None` if
+        it could not be fetched.
+        """
+        async with semaphore:
+            try:
+                user = await self.client.fetch_user(identity.discord_id)
+            except Exception:
+                logger.warning(f"Failed to fetch user {identity.discord_id}.")
+                return None
+
+        return user.display_name
+
+    async def refresh(self, identities=None):
+        """Refresh the display names of the given identities, or of all
+        claimed identities.
+
+        Return the number of display names that changed.
+        """
+        if identities is None:
+            identities = self.identity_manager.claimed_identities
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        names = await asyncio.gather(*[self.fetch_display_name(identity, semaphore)
+                                       for identity in identities])
+        changed = 0
+
+        for identity, name in zip(identities, names):
+            if name is not None and name != identity.display_name:
+                self.identity_manager.set_display_name(identity, name)
+                changed += 1
+
+        if changed > 0:
+            try:
+                self.identity_manager.save_display_names(self.path)
+            except OSError:
+                logger.exception("Failed to save the display names.")
+
+            await emit_signal("display_names_updated")
+
+        return changed
+
+    async def run(self):
+        while True:
+            # An error must not stop the periodic refresh
+            try:
+                changed = await self.refresh()
+                logger.info(f"Display names refreshed, {changed} changed.")
+            except Exception:
+                logger.exception("Failed to refresh the display names.")
+
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start refreshing the display names periodically in the
+        background, beginning now.
+        """
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
 
 class IdentityNotFoundError(Exception):
     def __init__(self, searchkey=None):
@@ -2,14 +2,12 @@ import discord
 import git
 import io
 import os
-from tqdm import tqdm
 import time
 import sys
 import asyncio
 
 from datetime import datetime, timedelta
-
-from difflib import get_close_matches
+from functools import partial
 
 from discord import Embed, File
 from discord.ext import commands, tasks
@@ -17,13 +15,14 @@ from discord.ext.commands import Bot
 
 from matplotlib import pyplot as plt
 
-from identity import IdentityManager, IdentityNotFoundError
+from identity import DisplayNameUpdater, IdentityManager, IdentityNotFoundError
 from messages import msg_builder
-from ranking import ranking_types
-from save_and_load import (load_ranking_configs, load_tokens,
-                           parse_matchboard_msg, get_game_results,
-                           save_single_game, get_current_form)
-from utils import connect, emit_signal, logger, partition
+from ranking import ranking_types, rebuild_in_parallel, rebuild_rankings
+from save_and_load import (load_bot_config, load_ranking_configs, load_tokens,
+                           parse_matchboard_msg, iter_saved_games,
+                           stream_game_results, get_current_form,
+                           GameLogWriter)
+from utils import connect, emit_signal, logger
 
 
 tokens = load_tokens()
@@ -35,7 +34,11 @@ class Kamlbot(Bot):
     def __init__(self, *args, **kwargs):
         connect("rankings_updated", self.edit_leaderboard)
         connect("game_registered", self.send_game_result)
+        connect("display_names_updated", self.edit_leaderboard)
 
+        self.bot_config = load_bot_config()
+        self.display_name_updater = None
+        self.game_log_writer = None
         self.identity_manager = None
         self.rankings = dict()
         self.is_ready = False
@@ -67,7 +70,7 @@ class Kamlbot(Bot):
 
             config = self.ranking_configs["weekly"]
             self.rankings["weekly"] = ranking_types[config["type"]](
-                                        name,
+                                        "weekly",
                                         self.identity_manager,
                                         **config)
 
@@ -99,30 +102,11 @@ class Kamlbot(Bot):
             for msg in ranking.leaderboard_messages():
                 await msg["msg"].edit(content=msg["content"])
 
-    def find_names(self, nameparts, n=1):
-        k = len(nameparts)
-
-        if k == n:
-            return nameparts
-
-        for ps in partition(k, n):
-            s = 0
-            allgood = True
-            names = []
-
-            for p in ps:
-                name = " ".join(nameparts[s:s+p])
-                s += p
-                names.append(name)
-
-                if name not in self.identity_manager.aliases:
-                    allgood = False
-                    break
-
-            if allgood:
-                return names
-
-        return None
+    def find_names(self, nameparts, n=1, limit=5):
+        """Return the ways to build `n` aliases from the given words, up to
+        `limit` of them.
+        """
+        return self.identity_manager.split_aliases(nameparts, n, limit=limit)
 
     async def get_identities(self, nameparts, cmd=None, n=1):
         if isinstance(nameparts, str):
@@ -158,9 +142,9 @@ class Kamlbot(Bot):
 
                 raise
 
-        names = self.find_names(nameparts, n=n)
+        splits = self.find_names(nameparts, n=n)
 
-        if names is None:
+        if len(splits) == 0:
             await msg_builder.send(
                     cmd.channel,
                     "unable_to_build_alias",
@@ -168,8 +152,17 @@ class Kamlbot(Bot):
 
             raise IdentityNotFoundError(" ".join(nameparts))
 
+        elif len(splits) > 1:
+            await msg_builder.send(
+                    cmd.channel,
+                    "ambiguous_aliases",
+                    n=n,
+                    splits="\n".join(" | ".join(names) for names in splits))
+
+            raise IdentityNotFoundError(" ".join(nameparts))
+
         else:
-            return [self.identity_manager[name] for name in names]
+            return [self.identity_manager[name] for name in splits[0]]
 
     async def load_all(self):
         """Load everything from files and fetch missing games from the
@@ -178,9 +171,30 @@ class Kamlbot(Bot):
         Erase the current state of the Kamlbot.
         """
         msg_builder.reload()
+
+        # Games still queued must be written before reading the game log
+        if self.game_log_writer is not None:
+            await self.game_log_writer.close()
+
+        if self.display_name_updater is not None:
+            await self.display_name_updater.close()
+
+        self.bot_config = load_bot_config()
+        self.game_log_writer = GameLogWriter(
+                backend=self.bot_config["game_log"],
+                flush_interval=self.bot_config["game_log_flush_interval"],
+                fsync=self.bot_config["game_log_fsync"])
         self.identity_manager = IdentityManager()
         self.identity_manager.load_data()
 
+        # Last known display names, refreshed in the background once the
+        # leaderboards are built
+        self.identity_manager.load_display_names()
+        self.display_name_updater = DisplayNameUpdater(
+                self.identity_manager, self,
+                concurrency=self.bot_config["display_name_concurrency"],
+                interval=self.bot_config["display_name_refresh_interval"])
+
         logger.info("Fetching game results.")
 
         now = datetime.now()
@@ -206,11 +220,28 @@ class Kamlbot(Bot):
                                     self.identity_manager,
                                     **config)
 
-        game_results = await get_game_results(self.matchboard)
-        for game in tqdm(game_results):
-            await self.register_game(game, save=False, signal_update=False)
+        backend = self.bot_config["game_log"]
+        game_stream = stream_game_results(self.matchboard, backend=backend)
+
+        # Each ranking restarts from its newest valid checkpoint and only
+        # replays the games that came after it.
+        if self.bot_config["parallel_replay"]:
+            # Workers read the saved games, so all missing games are
+            # fetched and saved first
+            async for _ in game_stream:
+                pass
+
+            await rebuild_in_parallel(self.rankings,
+                                      self.ranking_configs,
+                                      backend=backend)
+        else:
+            await rebuild_rankings(self.rankings,
+                                   game_stream,
+                                   partial(iter_saved_games, backend=backend))
+
+        self.game_log_writer.start()
+        self.display_name_updater.start()
 
-        await self.update_display_names()
         await self.edit_leaderboard()
 
     # Called for every messages sent in any of the server to which the bot
@@ -230,6 +261,18 @@ class Kamlbot(Bot):
         elif msg.guild.id == tokens["kaml_server_id"]:
             await self.process_commands(msg)
 
+    # Called when a user updates their profile, e.g. their global display
+    # name. The stored display names are those of the users fetched with
+    # `fetch_user`, so server nicknames are ignored.
+    async def on_user_update(self, before, after):
+        if not self.is_ready or before.display_name == after.display_name:
+            return
+
+        identity = self.identity_manager.discord_id_to_identity.get(after.id)
+
+        if identity is not None:
+            await self.display_name_updater.refresh([identity])
+
     # Called when the Bot has finished his initialization. May be called
     # multiple times (I have no idea why though)
     async def on_ready(self):
@@ -287,11 +330,14 @@ class Kamlbot(Bot):
             return None
 
         if save:
-            save_single_game(game)
+            self.game_log_writer.add(game)
 
         for name, ranking in self.rankings.items():
             change = ranking.register_game(game)
 
+            if ranking.game_count % ranking.checkpoint_interval == 0:
+                ranking.save_checkpoint()
+
             if signal_update and name == "main":
                 await emit_signal("game_registered", change)
 
@@ -333,16 +379,6 @@ class Kamlbot(Bot):
         embed.set_footer(text="")
         await self.kamlboard.send(embed=embed)
 
-    async def update_display_names(self):
-        """Update the string used to identify players for all players.
-
-        Currently fetch the server nickname of every registered players.
-        """
-
-        for identity in self.identity_manager.claimed_identities:
-            user = await self.fetch_user(identity.discord_id)
-            identity.display_name = user.display_name
-
 
 kamlbot = Kamlbot(command_prefix="!")
 
@@ -395,8 +431,7 @@ async def alias(cmd, name=None):
         alias_identity = kamlbot.identity_manager[name]
 
         if claimant_identity is None:
-            alias_identity.discord_id = user.id
-            kamlbot.identity_manager.discord_id_to_identity[user.id] = alias_identity
+            kamlbot.identity_manager.claim(alias_identity, user.id)
 
             await msg_builder.send(
                         cmd.channel,
@@ -404,9 +439,7 @@ async def alias(cmd, name=None):
                         new_alias=name)
 
         else:
-            claimant_identity.aliases.add(name)
-            alias_identity.aliases = set()
-            kamlbot.identity_manager.alias_to_identity[name] = claimant_identity
+            kamlbot.identity_manager.add_alias(claimant_identity, name)
 
             await msg_builder.send(
                         cmd.channel,
@@ -449,44 +482,32 @@ async def allinfo(cmd, *nameparts):
 
     await cmd.channel.send(msg)
 
-    # Obtaining Rivals info
-    rivals_dict = {key: (player.games_against[key], player.win_percents[key]) for key in player.win_percents}
-    rivals_dict = {k: (v[0], v[1]) for k, v in rivals_dict.items() if v[0] > 8}  # only include 9 or more games played against
-    rivals_dict = {k: (v[0], v[1]) for k, v in rivals_dict.items() if 0.4 < v[1] < 0.6}  # only include within 40-60% win rate
+    # Obtaining Rivals info, sorted by games played, then by closest to
+    # 50% win rate
+    rivals = ranking.rivals.top(player.id, 5)
 
     # Building Rivals message
-    if not rivals_dict:
+    if not rivals:
         rivals_msg = "None yet, play more!"
-    elif rivals_dict:
-        # Sorts by games played, then by closest to 50% win rate
-        sorted_rivals_list = sorted(rivals_dict.items(), key=lambda a: (-a[1][0], abs(0.5-a[1][1])))
-
-        sorted_rivals_list = sorted_rivals_list[:5]
+    else:
         rivals_msg = ""
-        for opponent in sorted_rivals_list:
-            opponent = opponent[0]
-            opp_name = opponent.display_name
-            h2h_record = str(ranking.wins[(player, opponent)]) + " – " + str(ranking.wins[(opponent, player)])
-            rivals_msg += "**" + opp_name + "**\t" + h2h_record + " (" + '{:.2f}'.format(rivals_dict[opponent][1]*100) + "%)\n"
+        for opponent_id, wins, losses in rivals:
+            opp_name = ranking.id_to_player[opponent_id].display_name
+            h2h_record = str(wins) + " – " + str(losses)
+            rivals_msg += "**" + opp_name + "**\t" + h2h_record + " (" + '{:.2f}'.format(wins/(wins + losses)*100) + "%)\n"
 
     # Obtain and Build Peak message
-    compare_rank = 0
-    peak_rank = len(ranking.rank_to_player)
-    for timestamp, drank in list(player.delta_ranks.items()):
-        compare_rank += drank
-        if compare_rank < peak_rank:
-            peak_rank = compare_rank
-            peak_rank_time = time.strftime("%d %b %Y", time.gmtime(timestamp))
-    peak_rank = str(peak_rank)
-
-    peak_score = max(player.scores)
-    for timestamp, tsstate in list(player.states.items()):
-        if tsstate.score == peak_score:
-            peak_score_timestamp = timestamp
-            peak_score_sigma = tsstate.sigma
-            break
-    peak_score_time = time.strftime("%d %b %Y", time.gmtime(peak_score_timestamp))
-    
+    if player.best_rank is not None:
+        peak_rank = str(player.display_best_rank)
+        peak_rank_time = time.strftime("%d %b %Y", time.gmtime(player.best_rank_time))
+    else:
+        peak_rank = "-"
+        peak_rank_time = "-"
+
+    peak_score = player.peak_score
+    peak_score_sigma = player.peak_state.sigma
+    peak_score_time = time.strftime("%d %b %Y", time.gmtime(player.peak_score_time))
+
     peak_msg = ":military_medal: **{}** (on {})\n:camel: **{:.2f} (±{:.2f})** (on {})".format(peak_rank,
                                                                                          peak_rank_time,
                                                                                          peak_score,
@@ -494,8 +515,8 @@ async def allinfo(cmd, *nameparts):
                                                                                          peak_score_time)
 
     # Obtain and Build Cool Stats message
-    first_game_date = time.strftime("%d %b %Y", time.gmtime(list(player.saved_states.items())[0][0]))
-    last_game_date = time.strftime("%d %b %Y", time.gmtime(list(player.saved_states.items())[-1][0]))
+    first_game_date = time.strftime("%d %b %Y", time.gmtime(player.times[0]))
+    last_game_date = time.strftime("%d %b %Y", time.gmtime(player.times[-1]))
     coolstats_msg = "First Game: **" + first_game_date + "**\n"
     coolstats_msg += "Last Game: **" + last_game_date + "**\n"
     coolstats_msg += "Longest Win Streak: **" + str(player.longest_win_streak) + "**\n"
@@ -633,7 +654,7 @@ async def rank(cmd, *nameparts):
 
     player = kamlbot.rankings["main"][identity]
 
-    current_form, no_of_games = get_current_form(player, 15)
+    current_form, no_of_games = get_current_form(player)
 
     msg = msg_builder.build("player_rank",
                             player=player)
@@ -674,6 +695,8 @@ async def restart(cmd, param=None):
     with open("config/restart_chan.txt", "w") as file:
         file.write(str(cmd.channel.id))
 
+    await kamlbot.game_log_writer.close()
+
     os.execv(sys.executable, ["python", "src/kamlbot.py", "-restart"])
 
 
@@ -681,8 +704,7 @@ async def restart(cmd, param=None):
 Search for a player. Optional argument `n` is the maximal number of name returned.
 """)
 async def search(cmd, name, n=5):
-    matches = get_close_matches(name, kamlbot.identity_manager.aliases,
-                                n=n)
+    matches = kamlbot.identity_manager.search(name, n=n)
 
     msg = "\n".join(matches)
     await cmd.channel.send(f"```\n{msg}\n```")
@@ -697,6 +719,8 @@ async def stop(cmd):
     await kamlbot.change_presence(activity=None, status=discord.Status.offline)
     await cmd.channel.send("The Kamlbot takes his leave.")
     logger.info("Disconnecting Kamlbot.")
+    await kamlbot.game_log_writer.close()
+    await kamlbot.display_name_updater.close()
     await kamlbot.close()
 
 
@@ -708,4 +732,6 @@ async def test(cmd):
     logger.info("The Kamlbot is being tested.")
     await cmd.channel.send("The Kamlbot is working, working hard even.")
 
-kamlbot.run(tokens["bot_token"])
+# Guard needed because worker processes may import this module
+if __name__ == "__main__":
+    kamlbot.run(tokens["bot_token"])
@@ -1,29 +1,61 @@
-import numpy as np
-import time
+from collections import deque
 
-from collections import OrderedDict, defaultdict
+from history import NO_VALUE
 
 
 class Player:
     """Class representing a player in a given ranking.
 
     Associate an Identity to a ranking state and keep track of the history
-    of states.
+    of states, stored in a `History`.
     """
-    def __init__(self, player_identity, initial_state):
+    __slots__ = ["identity",
+                 "id",
+                 "rank_index",
+                 "history",
+                 "state",
+                 "current_win_streak",
+                 "longest_win_streak",
+                 "current_lose_streak",
+                 "longest_lose_streak",
+                 "best_rank",
+                 "best_rank_time",
+                 "peak_state",
+                 "peak_score_time",
+                 "recent_results"]
+
+    # Attributes describing the player in addition to its states
+    stats_attributes = ["current_win_streak",
+                        "longest_win_streak",
+                        "current_lose_streak",
+                        "longest_lose_streak",
+                        "best_rank",
+                        "best_rank_time",
+                        "peak_state",
+                        "peak_score_time",
+                        "recent_results"]
+
+    def __init__(self, player_identity, initial_state, history, form_length=15):
         self.identity = player_identity
-        self.saved_states = OrderedDict()
+        self.id = None  # Index of the player in its ranking
+        self.rank_index = None  # RankIndex of the ranking
+        self.history = history
         self.state = initial_state
-        self.win_percents = defaultdict(float)
-        self.games_against = defaultdict(int)
         self.current_win_streak = 0
         self.longest_win_streak = 0
         self.current_lose_streak = 0
         self.longest_lose_streak = 0
-        self.delta_ranks = OrderedDict()
 
-    def __getattr__(self, attr):
-        return getattr(self.state, attr)
+        # Best rank reached and state with the highest score, updated as
+        # games are registered
+        self.best_rank = None
+        self.best_rank_time = None
+        self.peak_state = None
+        self.peak_score_time = None
+
+        # Results of the last games, most recent first, as tuples
+        # `(won, opponent id)`
+        self.recent_results = deque(maxlen=form_length)
 
     def __repr__(self):
         return self.__str__()
@@ -31,10 +63,12 @@ class Player:
     def __str__(self):
         return f"Player {self.display_name} rank {self.rank} with score {self.score} ({self.state})"
 
-    def asdict(self):
-        return dict(
-            states={t: s.asdict() for t, s in self.states.items()}
-        )
+    @property
+    def display_best_rank(self):
+        if self.best_rank is None:
+            return None
+
+        return self.best_rank + 1
 
     @property
     def display_name(self):
@@ -51,21 +85,50 @@ class Player:
 
         return self.rank + 1
 
+    @property
+    def level(self):
+        return self.state.level
+
     @property
     def losses(self):
         return self.state.losses
 
     @property
-    def rank(self):
-        return self.state.rank
+    def mu(self):
+        return self.state.mu
 
-    @rank.setter
-    def rank(self, new_rank):
-        self.state.rank = new_rank
+    @property
+    def peak_score(self):
+        if self.peak_state is None:
+            return None
+
+        return self.peak_state.score
+
+    @property
+    def rank(self):
+        return self.rank_index.rank(self)
 
     @property
     def ranks(self):
-        return np.array([s.rank for s in self.states.values()])
+        return self.history["rank"]
+
+    def record_game(self, game, timestamp):
+        """Add the current state of the player to its history, as the state
+        after the game of the given index in the game log.
+
+        Also update the peak score.
+        """
+        if self.peak_state is None or self.score > self.peak_state.score:
+            self.peak_state = self.state
+            self.peak_score_time = timestamp
+
+        rank = self.rank
+        values = self.state.asdict()
+        values.update(game=game,
+                      time=timestamp,
+                      score=self.score,
+                      rank=NO_VALUE if rank is None else rank)
+        self.history.append(values)
 
     @property
     def score(self):
@@ -73,25 +136,27 @@ class Player:
 
     @property
     def scores(self):
-        return np.array([s.score for s in self.states.values()])
+        return self.history["score"]
 
     @property
-    def states(self):
-        return {time.time(): self.state, **self.saved_states}
+    def sigma(self):
+        return self.state.sigma
 
     @property
     def times(self):
-        return np.array(list(self.states.keys()))
+        return self.history["time"]
 
     @property
     def total_games(self):
         return self.wins + self.losses
 
-    def update_state(self, new_state, timestamp=None):
-        if timestamp is None:
-            timestamp = time.time()
+    def update_best_rank(self, rank, timestamp):
+        """Update the best rank with the current rank of the player."""
+        if self.best_rank is None or rank < self.best_rank:
+            self.best_rank = rank
+            self.best_rank_time = timestamp
 
-        self.saved_states[timestamp] = self.state
+    def update_state(self, new_state):
         self.state = new_state
 
     @property
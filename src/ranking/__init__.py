@@ -1,7 +1,10 @@
 from .trueskill_ranking import TrueSkillRanking
 from .eel_ranking import EelRanking
 from .duchu_ranking import DuchuRanking
+from .vectorized_trueskill import VectorizedTrueSkillRanking
+from .rebuild import rebuild_in_parallel, rebuild_rankings
 
 ranking_types = dict(trueskill=TrueSkillRanking,
                      eel=EelRanking,
-                     duchu=DuchuRanking)
+                     duchu=DuchuRanking,
+                     vectorized_trueskill=VectorizedTrueSkillRanking)
@@ -0,0 +1,162 @@
+"""Helpers for rankings updating the ratings of many games at once."""
+import numpy as np
+
+from .ranking import AbstractRanking
+
+
+def grow(array, size, fill):
+    """Return the array extended to at least `size` elements, the new ones
+    being set to `fill`.
+
+    The capacity is doubled when extended, so that adding players one by
+    one stays cheap.
+    """
+    if size <= len(array):
+        return array
+
+    new_array = np.full(max(size, 2*len(array)), fill, dtype=array.dtype)
+    new_array[:len(array)] = array
+    return new_array
+
+
+def schedule_rounds(winner_ids, loser_ids):
+    """Split games in rounds in which every player plays at most once.
+
+    The games of a round only depend on the results of games of previous
+    rounds, and can thus be rated all at once. The games of a player keep
+    their order.
+
+    Return the array of the round of each game, and the number of rounds.
+    """
+    last_round = {}
+    rounds = []
+
+    for winner_id, loser_id in zip(winner_ids, loser_ids):
+        r = max(last_round.get(winner_id, -1), last_round.get(loser_id, -1)) + 1
+        last_round[winner_id] = last_round[loser_id] = r
+        rounds.append(r)
+
+    return np.array(rounds, dtype=np.int64), max(rounds, default=-1) + 1
+
+
+def split_rounds(rounds, n_rounds):
+    """Return the indices of the games of each round, in order."""
+    order = np.argsort(rounds, kind="stable")
+    bounds = np.searchsorted(rounds[order], np.arange(1, n_rounds))
+    return np.split(order, bounds)
+
+
+class BatchRanking(AbstractRanking):
+    """Ranking storing the ratings of the players in NumPy arrays indexed by
+    player id, and rating the replayed games by rounds.
+
+    The rated fields of the states and their NumPy type are given in
+    `rating_fields`, in the order of the arguments of the state type.
+    Subclasses implement `rate_round`, that rates all games of a round at
+    once.
+    """
+    rating_fields = {}
+
+    def __init__(self, name, identity_manager, **kwargs):
+        # New ratings of the games being replayed
+        self.pending_ratings = None
+
+        super().__init__(name, identity_manager, **kwargs)
+
+    def load_state(self, file):
+        super().load_state(file)
+        self.ratings = {
+            field: np.array([getattr(player.state, field)
+                             for player in self.id_to_player], dtype=dtype)
+            for field, dtype in self.rating_fields.items()}
+
+    def new_player(self, identity, state=None):
+        player = super().new_player(identity, state)
+
+        for field, array in self.ratings.items():
+            array = grow(array, player.id + 1, 0)
+            array[player.id] = getattr(player.state, field)
+            self.ratings[field] = array
+
+        return player
+
+    def rate_games(self, winner_ids, loser_ids):
+        """Rate games given by the ids of their players, in order, and
+        update the ratings of the players.
+
+        Return the list of the new ratings after each game, as pairs
+        `(winner ratings, loser ratings)` of tuples of the rated fields.
+        """
+        winner_ratings = {field: np.empty(len(winner_ids), dtype=dtype)
+                          for field, dtype in self.rating_fields.items()}
+        loser_ratings = {field: np.empty(len(loser_ids), dtype=dtype)
+                         for field, dtype in self.rating_fields.items()}
+        rounds, n_rounds = schedule_rounds(winner_ids.tolist(),
+                                           loser_ids.tolist())
+
+        for games in split_rounds(rounds, n_rounds):
+            wids = winner_ids[games]
+            lids = loser_ids[games]
+            new_winner, new_loser = self.rate_round(
+                {field: array[wids] for field, array in self.ratings.items()},
+                {field: array[lids] for field, array in self.ratings.items()})
+
+            for field, array in self.ratings.items():
+                array[wids] = new_winner[field]
+                array[lids] = new_loser[field]
+                winner_ratings[field][games] = new_winner[field]
+                loser_ratings[field][games] = new_loser[field]
+
+        return list(zip(
+            zip(*(ratings.tolist() for ratings in winner_ratings.values())),
+            zip(*(ratings.tolist() for ratings in loser_ratings.values()))))
+
+    def rate_round(self, winner_ratings, loser_ratings):
+        """Rate games in which each player plays at most once.
+
+        The ratings of the winners and of the losers are given as dicts of
+        arrays, with one element per game. Return the new ratings, in the
+        same form.
+        """
+        raise NotImplementedError()
+
+    def replay(self, games):
+        games = list(games)
+        ids = []
+
+        for game in games:
+            if self.includes(game):
+                self.ensure_alias_existence(game["winner"])
+                self.ensure_alias_existence(game["loser"])
+                ids.append((self.alias_to_player[game["winner"]].id,
+                            self.alias_to_player[game["loser"]].id))
+
+        ids = np.array(ids, dtype=np.int64).reshape(-1, 2)
+        self.pending_ratings = iter(self.rate_games(ids[:, 0], ids[:, 1]))
+
+        try:
+            super().replay(games)
+        finally:
+            self.pending_ratings = None
+
+    def reset(self):
+        self.ratings = {field: np.zeros(0, dtype=dtype)
+                        for field, dtype in self.rating_fields.items()}
+        super().reset()
+
+    def update_players(self, winner, loser, timestamp=None):
+        if self.pending_ratings is None:
+            ratings = self.rate_games(np.array([winner.id]),
+                                      np.array([loser.id]))[0]
+        else:
+            ratings = next(self.pending_ratings)
+
+        winner_ratings, loser_ratings = ratings
+
+        winner.update_state(self.state_type(*winner_ratings,
+                                            wins=winner.wins + 1,
+                                            losses=winner.losses))
+
+        loser.update_state(self.state_type(*loser_ratings,
+                                           wins=loser.wins,
+                                           losses=loser.losses + 1))
@@ -0,0 +1,178 @@
+import io
+import json
+import numpy as np
+import pickle
+
+from history import History
+from identity import Identity
+from player import Player
+
+
+class StaleCheckpointError(Exception):
+    def __init__(self, reason):
+        self.reason = reason
+
+    def __str__(self):
+        return f"Checkpoint can not be used: {self.reason}."
+
+
+def find_identity(identity_manager, aliases):
+    """Return the identity of the IdentityManager with exactly the given
+    aliases, creating it if none of the aliases is known.
+
+    Raise a `StaleCheckpointError` if the aliases have been assigned to
+    other identities.
+    """
+    identities = {identity_manager.alias_to_identity.get(alias)
+                  for alias in aliases}
+
+    # All aliases are unknown, the identity was created while
+    # registering games
+    if identities == {None}:
+        return identity_manager.add_identity(discord_id=None,
+                                             aliases=aliases)
+
+    if len(identities) == 1:
+        identity = identities.pop()
+
+        if identity.aliases == set(aliases):
+            return identity
+
+    raise StaleCheckpointError(f"aliases {aliases} have been reassigned")
+
+
+class CheckpointPickler(pickle.Pickler):
+    """Pickler storing players and identities by reference rather than by
+    value.
+
+    Players are stored as their index in the checkpoint and identities as
+    their aliases. This allows to bind the restored players to the
+    identities of the current IdentityManager.
+    """
+    def __init__(self, file, player_index):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.player_index = player_index
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Player):
+            return ("player", self.player_index[obj])
+
+        if isinstance(obj, Identity):
+            return ("identity", tuple(sorted(obj.aliases)))
+
+        return None
+
+
+class CheckpointUnpickler(pickle.Unpickler):
+    def __init__(self, file, identity_manager, players):
+        super().__init__(file)
+        self.identity_manager = identity_manager
+        self.players = players
+
+    def persistent_load(self, pid):
+        kind, key = pid
+
+        if kind == "player":
+            return self.players[key]
+
+        return find_identity(self.identity_manager, key)
+
+
+def dump_checkpoint(ranking, file):
+    """Write the full state of the ranking to a binary file, in NumPy `.npz`
+    format.
+
+    The histories of the players make the bulk of the data and are stored
+    as they are, one after the other. The rest is pickled, with players and
+    identities stored by reference.
+    """
+    players = list(ranking.identity_to_player.values())
+    player_index = {player: k for k, player in enumerate(players)}
+
+    columns = dict(
+        history=np.concatenate([player.history.rows for player in players]
+                               or [np.zeros(0, dtype=ranking.history_dtype)]),
+        history_length=np.array([len(player.history) for player in players],
+                                dtype=np.int64))
+
+    aliases = ["\n".join(sorted(player.identity.aliases)) for player in players]
+
+    extra = dict(attributes={attr: getattr(ranking, attr)
+                             for attr in ranking.checkpoint_attributes},
+                 players=[{attr: getattr(player, attr)
+                           for attr in Player.stats_attributes}
+                          for player in players])
+    buffer = io.BytesIO()
+    CheckpointPickler(buffer, player_index).dump(extra)
+
+    np.savez(file,
+             settings=np.array(json.dumps(ranking.settings)),
+             player_aliases=np.array(aliases, dtype=str),
+             extra=np.frombuffer(buffer.getvalue(), dtype=np.uint8),
+             **columns)
+
+
+def load_checkpoint(ranking, file):
+    """Restore the state of the ranking from a binary file written by
+    `dump_checkpoint`.
+
+    Raise a `StaleCheckpointError` if the state is not consistent with the
+    configuration of the ranking or the current identities.
+    """
+    with np.load(file, allow_pickle=False) as data:
+        settings = json.loads(str(data["settings"]))
+
+        if settings != ranking.settings:
+            raise StaleCheckpointError("ranking settings have changed")
+
+        identities = [find_identity(ranking.identity_manager,
+                                    tuple(alias for alias in aliases.split("\n")
+                                          if alias != ""))
+                      for aliases in data["player_aliases"].tolist()]
+
+        history = data["history"]
+        bounds = np.concatenate(([0], np.cumsum(data["history_length"]))).tolist()
+
+        if history.dtype != ranking.history_dtype:
+            raise StaleCheckpointError("history format has changed")
+
+        extra = data["extra"].tobytes()
+
+    players = []
+    state_type = ranking.state_type
+    fields = list(state_type.fields)
+
+    for k, identity in enumerate(identities):
+        start, end = bounds[k], bounds[k + 1]
+        rows = history[start:end]
+
+        # The current state is the one after the last game
+        if end > start:
+            state = state_type.fromdict(dict(zip(fields,
+                                                 rows[fields][-1].tolist())))
+        else:
+            state = ranking.initial_player_state()
+
+        player = Player(identity, state, History.from_rows(rows),
+                        form_length=ranking.form_length)
+        player.id = k
+
+        players.append(player)
+
+    extra = CheckpointUnpickler(io.BytesIO(extra),
+                                ranking.identity_manager,
+                                players).load()
+
+    for player, stats in zip(players, extra["players"]):
+        for attr, value in stats.items():
+            setattr(player, attr, value)
+
+    for attr, value in extra["attributes"].items():
+        setattr(ranking, attr, value)
+
+    for player in players:
+        player.rank_index = ranking.rank_index
+
+    ranking.id_to_player = players
+    ranking.identity_to_player = {player.identity: player for player in players}
+    ranking.add_missing_players()
@@ -1,9 +1,56 @@
-from .ranking import AbstractRanking, AbstractState
+import numpy as np
+
+from .batch import BatchRanking
+from .ranking import AbstractState
+
+
+# Points won by the winner (and lost by the loser) of a game, indexed by the
+# ratio in percent of the lowest score to the highest one. A ratio rounding
+# to 0 % gives the same points as 1 %.
+UNEXPECTED_POINTS = np.array([
+    1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
+    1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
+    1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
+    1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
+    1, 1, 1, 1, 1, 1, 1, 2, 2, 2,
+    2, 2, 2, 2, 2, 3, 3, 3, 3, 4,
+    4, 4, 4, 5, 5, 5, 6, 6, 7, 7,
+    8, 8, 9, 9, 10, 10, 11, 12, 13, 13,
+    14, 15, 16, 17, 18, 19, 20, 22, 23, 24,
+    26, 28, 29, 31, 29, 28, 26, 24, 23, 22,
+    20])
+
+EXPECTED_POINTS = np.where(np.arange(101) >= 86,
+                           40 - UNEXPECTED_POINTS, UNEXPECTED_POINTS)
+
+
+def ratio_index(low_scores, high_scores):
+    """Index in the point tables of the ratios of the scores, that is the
+    ratios in percent rounded like `round(ratio, 2)`.
+
+    Two null scores have a ratio of 1.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.where(high_scores > 0, low_scores / high_scores, 1.0)
+
+    percents = ratios * 100
+    indices = np.rint(percents).astype(np.int64)
+
+    # NumPy rounds halves to even after the multiplication, while `round`
+    # rounds the exact value of the ratio, so these are rounded one by one
+    halves = np.flatnonzero(np.abs(percents % 1 - 0.5) < 1e-6)
+
+    for k in halves.tolist():
+        indices[k] = round(round(float(ratios[k]), 2) * 100)
+
+    return indices
 
 
 class DuchuState(AbstractState):
-    def __init__(self, score=2000, rank=None, wins=0, losses=0):
-        self.rank = rank
+    __slots__ = ["_score"]
+    fields = dict(AbstractState.fields, score="i4")
+
+    def __init__(self, score=2000, wins=0, losses=0):
         self.wins = wins
         self.losses = losses
         self._score = score
@@ -16,142 +63,25 @@ class DuchuState(AbstractState):
         return self._score
 
 
-class DuchuRanking(AbstractRanking):
-    def __init__(self, name, identity_manager,
-                 **kwargs):
-
-        super().__init__(name, identity_manager, **kwargs)
-
-        self.unexpected_points = {
-            1.00: 20,
-            0.99: 22,
-            0.98: 23,
-            0.97: 24,
-            0.96: 26,
-            0.95: 28,
-            0.94: 29,
-            0.93: 31,
-            0.92: 29,
-            0.91: 28,
-            0.9: 26,
-            0.89: 24,
-            0.88: 23,
-            0.87: 22,
-            0.86: 20,
-            0.85: 19,
-            0.84: 18,
-            0.83: 17,
-            0.82: 16,
-            0.81: 15,
-            0.8: 14,
-            0.79: 13,
-            0.78: 13,
-            0.77: 12,
-            0.76: 11,
-            0.75: 10,
-            0.74: 10,
-            0.73: 9,
-            0.72: 9,
-            0.71: 8,
-            0.7: 8,
-            0.69: 7,
-            0.68: 7,
-            0.67: 6,
-            0.66: 6,
-            0.65: 5,
-            0.64: 5,
-            0.63: 5,
-            0.62: 4,
-            0.61: 4,
-            0.6: 4,
-            0.59: 4,
-            0.58: 3,
-            0.57: 3,
-            0.56: 3,
-            0.55: 3,
-            0.54: 2,
-            0.53: 2,
-            0.52: 2,
-            0.51: 2,
-            0.5: 2,
-            0.49: 2,
-            0.48: 2,
-            0.47: 2,
-            0.46: 1,
-            0.45: 1,
-            0.44: 1,
-            0.43: 1,
-            0.42: 1,
-            0.41: 1,
-            0.4: 1,
-            0.39: 1,
-            0.38: 1,
-            0.37: 1,
-            0.36: 1,
-            0.35: 1,
-            0.34: 1,
-            0.33: 1,
-            0.32: 1,
-            0.31: 1,
-            0.3: 1,
-            0.29: 1,
-            0.28: 1,
-            0.27: 1,
-            0.26: 1,
-            0.25: 1,
-            0.24: 1,
-            0.23: 1,
-            0.22: 1,
-            0.21: 1,
-            0.2: 1,
-            0.19: 1,
-            0.18: 1,
-            0.17: 1,
-            0.16: 1,
-            0.15: 1,
-            0.14: 1,
-            0.13: 1,
-            0.12: 1,
-            0.11: 1,
-            0.1: 1,
-            0.09: 1,
-            0.08: 1,
-            0.07: 1,
-            0.06: 1,
-            0.05: 1,
-            0.04: 1,
-            0.03: 1,
-            0.02: 1,
-            0.01: 1
-            }
-
-        self.expected_points = dict(self.unexpected_points)
-
-        for r, pt in self.unexpected_points.items():
-            if r >= 0.86:
-                self.expected_points[r] = 40 - pt
+class DuchuRanking(BatchRanking):
+    """Ranking in which the points exchanged in a game depend on the ratio
+    of the scores of the players.
+
+    Scores are integers, so rating games by rounds with NumPy gives exactly
+    the same results as rating them one by one.
+    """
+    state_type = DuchuState
+    rating_fields = dict(score="i8")
 
     def initial_player_state(self):
         return DuchuState()
 
-    def update_players(self, winner, loser, timestamp=None):
-        if winner.score > loser.score:
-            ratio = loser.score/winner.score
-            ratio = round(ratio, 2)
-            dscore = self.expected_points[ratio]
-        else:
-            ratio = winner.score/loser.score
-            ratio = round(ratio, 2)
-            dscore = self.expected_points[ratio]
-
-        winner.update_state(DuchuState(
-            rank=winner.rank,
-            score=winner.score + dscore,
-            wins=winner.wins + 1,
-            losses=winner.losses))
-
-        loser.update_state(DuchuState(
-            rank=loser.rank,
-            score=max(0, loser.score - dscore),
-            wins=loser.wins,
-            losses=loser.losses + 1))
+    def rate_round(self, winner_ratings, loser_ratings):
+        winner_scores = winner_ratings["score"]
+        loser_scores = loser_ratings["score"]
+        indices = ratio_index(np.minimum(winner_scores, loser_scores),
+                              np.maximum(winner_scores, loser_scores))
+        dscores = EXPECTED_POINTS[indices]
+
+        return (dict(score=winner_scores + dscores),
+                dict(score=np.maximum(0, loser_scores - dscores)))
@@ -1,9 +1,21 @@
-from .ranking import AbstractRanking, AbstractState
+import numpy as np
+
+from .batch import BatchRanking
+from .ranking import AbstractState
+
+
+MAX_LEVEL = 6
+
+# Points won by the winner (and lost by the loser) of a game, indexed by the
+# level of the loser minus the level of the winner, offset by `MAX_LEVEL`
+POINTS = np.array([1, 2, 4, 8, 15, 18, 20, 24, 30, 24, 17, 12, 9])
 
 
 class EelState(AbstractState):
-    def __init__(self, score=0, rank=None, wins=0, losses=0):
-        self.rank = rank
+    __slots__ = ["_score"]
+    fields = dict(AbstractState.fields, score="i4")
+
+    def __init__(self, score=0, wins=0, losses=0):
         self.wins = wins
         self.losses = losses
         self._score = score
@@ -13,49 +25,27 @@ class EelState(AbstractState):
 
     @property
     def level(self):
-        return min(self.score // 100, 6)
+        return min(self.score // 100, MAX_LEVEL)
 
     @property
     def score(self):
         return self._score
 
 
-class EelRanking(AbstractRanking):
-    def __init__(self, name, identity_manager,
-                 **kwargs):
-
-        super().__init__(name, identity_manager, **kwargs)
-
-        self.point_table = {
-            6: 9,
-            5: 12,
-            4: 17,
-            3: 24,
-            2: 30,
-            1: 24,
-            0: 20,
-            -1: 18,
-            -2: 15,
-            -3: 8,
-            -4: 4,
-            -5: 2,
-            -6: 1}
+class EelRanking(BatchRanking):
+    state_type = EelState
+    rating_fields = dict(score="i8")
 
     def initial_player_state(self):
         return EelState()
 
-    def update_players(self, winner, loser, timestamp=None):
-        dlevel = loser.level - winner.level
-        dscore = self.point_table[dlevel]
-
-        winner.update_state(EelState(
-            rank=winner.rank,
-            score=winner.score + dscore,
-            wins=winner.wins + 1,
-            losses=winner.losses))
-
-        loser.update_state(EelState(
-            rank=loser.rank,
-            score=max(0, loser.score - dscore),
-            wins=loser.wins,
-            losses=loser.losses + 1))
+    def rate_round(self, winner_ratings, loser_ratings):
+        winner_scores = winner_ratings["score"]
+        loser_scores = loser_ratings["score"]
+        winner_levels = np.minimum(winner_scores // 100, MAX_LEVEL)
+        loser_levels = np.minimum(loser_scores // 100, MAX_LEVEL)
+        dlevels = np.clip(loser_levels - winner_levels, -MAX_LEVEL, MAX_LEVEL)
+        dscores = POINTS[dlevels + MAX_LEVEL]
+
+        return (dict(score=winner_scores + dscores),
+                dict(score=np.maximum(0, loser_scores - dscores)))
@@ -0,0 +1,102 @@
+class HeadToHead:
+    """Head-to-head records of all pairs of players of a ranking, indexed by
+    player ids.
+
+    Each pair of players that has played together has an index. For each
+    pair, the number of wins of both players and the results of their most
+    recent games are stored, the latter packed as bits of an integer (1 if
+    the player with the lowest id won).
+    """
+    def __init__(self, recent_length=15):
+        self.recent_length = recent_length
+
+        # Dict opponent id -> pair index, for each player id
+        self.pairs = []
+
+        # Number of wins of the player with the lowest id and of the other
+        # one, for each pair
+        self.low_wins = []
+        self.high_wins = []
+
+        # Recent results, most recent in the lowest bit, and their number
+        self.recent = []
+        self.recent_count = []
+
+    def add_game(self, winner_id, loser_id):
+        """Record the result of a game."""
+        pair = self.pair(winner_id, loser_id, create=True)
+        low_won = winner_id <= loser_id
+
+        if low_won:
+            self.low_wins[pair] += 1
+        else:
+            self.high_wins[pair] += 1
+
+        mask = (1 << self.recent_length) - 1
+        self.recent[pair] = ((self.recent[pair] << 1) | low_won) & mask
+        self.recent_count[pair] = min(self.recent_count[pair] + 1,
+                                      self.recent_length)
+
+    def opponents(self, player_id):
+        """Iterate over the opponents of a player, as tuples
+        `(opponent id, wins, losses)`.
+        """
+        if player_id >= len(self.pairs):
+            return
+
+        for opponent_id in self.pairs[player_id]:
+            yield (opponent_id, *self.record(player_id, opponent_id))
+
+    def pair(self, id1, id2, create=False):
+        """Index of the pair of players, or `None` if they never played
+        together.
+        """
+        if max(id1, id2) >= len(self.pairs):
+            if not create:
+                return None
+
+            self.pairs.extend({} for _ in range(max(id1, id2) + 1 - len(self.pairs)))
+
+        pair = self.pairs[id1].get(id2)
+
+        if pair is None and create:
+            pair = len(self.low_wins)
+            self.pairs[id1][id2] = self.pairs[id2][id1] = pair
+            self.low_wins.append(0)
+            self.high_wins.append(0)
+            self.recent.append(0)
+            self.recent_count.append(0)
+
+        return pair
+
+    def recent_results(self, player_id, opponent_id):
+        """Results of the most recent games of the player against the
+        opponent, from the most recent, as booleans (True for a win).
+        """
+        pair = self.pair(player_id, opponent_id)
+
+        if pair is None:
+            return []
+
+        bits = self.recent[pair]
+        low = player_id <= opponent_id
+
+        return [bool((bits >> k) & 1) == low
+                for k in range(self.recent_count[pair])]
+
+    def record(self, player_id, opponent_id):
+        """Number of wins and losses of the player against the opponent."""
+        pair = self.pair(player_id, opponent_id)
+
+        if pair is None:
+            return 0, 0
+
+        # A player playing against itself (through two of its aliases) wins
+        # all games and loses all of them
+        if player_id == opponent_id:
+            return self.low_wins[pair], self.low_wins[pair]
+
+        if player_id < opponent_id:
+            return self.low_wins[pair], self.high_wins[pair]
+
+        return self.high_wins[pair], self.low_wins[pair]
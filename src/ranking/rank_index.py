@@ -0,0 +1,71 @@
+from sortedcontainers import SortedList
+
+
+class RankIndex:
+    """Players of a ranking sorted by decreasing score.
+
+    Support finding the rank of a player, moving a player and slicing in
+    O(log N). A player reaching the score of other players is ranked after
+    them when moving up, and before them when moving down, so that a player
+    never passes another one with the same score.
+    """
+    def __init__(self):
+        # Entries are tuples (-score, sequence number, player), the
+        # sequence number being unique players are never compared. Players
+        # moving up get increasing positive sequence numbers, and players
+        # moving down decreasing negative ones.
+        self.entries = SortedList()
+        self.player_entries = {}
+        self.sequence = 1
+
+    def __contains__(self, player):
+        return player in self.player_entries
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [entry[2] for entry in self.entries[key]]
+
+        return self.entries[key][2]
+
+    def __iter__(self):
+        return (entry[2] for entry in self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def rank(self, player):
+        """Rank of the player, starting at 0, or `None` if it is not
+        ranked.
+        """
+        entry = self.player_entries.get(player)
+
+        if entry is None:
+            return None
+
+        return self.entries.index(entry)
+
+    def remove(self, player):
+        entry = self.player_entries.pop(player, None)
+
+        if entry is not None:
+            self.entries.remove(entry)
+
+    def update(self, player, score):
+        """Insert the player with the given score, or move it if it is
+        already ranked.
+        """
+        entry = self.player_entries.get(player)
+
+        if entry is not None and entry[0] == -score:
+            return
+
+        if entry is not None and score < -entry[0]:
+            sequence = -self.sequence
+        else:
+            sequence = self.sequence
+
+        self.remove(player)
+        entry = (-score, sequence, player)
+        self.sequence += 1
+        self.entries.add(entry)
+        self.player_entries[player] = entry
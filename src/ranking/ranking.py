@@ -1,8 +1,20 @@
-import json
-from collections import namedtuple, deque
+import os
+import pickle
+import zipfile
 
+from collections import namedtuple
+from glob import escape as glob_escape, glob
+from math import inf
+
+from history import History, history_dtype
 from player import Player
-from utils import ChainedDict
+from save_and_load import TimestampIndex
+from utils import ChainedDict, chunks, logger
+
+from .checkpoint import StaleCheckpointError, dump_checkpoint, load_checkpoint
+from .head_to_head import HeadToHead
+from .rivals import Rivals
+from .rank_index import RankIndex
 
 ScoreChange = namedtuple("ScoreChange", ["winner",
                                          "loser",
@@ -19,12 +31,17 @@ ScoreChange = namedtuple("ScoreChange", ["winner",
 
 class AbstractState:
     """Abstract class for a player relative to a ranking."""
-    rank = None
-    wins = 0
-    losses = 0
+    __slots__ = ["wins", "losses"]
+
+    # Name and NumPy type of the data defining the state
+    fields = dict(wins="i4", losses="i4")
 
     def asdict(self):
-        raise NotImplementedError()
+        return {field: getattr(self, field) for field in self.fields}
+
+    @classmethod
+    def fromdict(cls, d):
+        return cls(**d)
 
     @property
     def score(self):
@@ -32,43 +49,138 @@ class AbstractState:
 
 
 class AbstractRanking:
+    # Type of the states of the players
+    state_type = AbstractState
+
+    # Attributes saved in checkpoints in addition to the players, they must
+    # fully describe the state of the ranking.
+    checkpoint_attributes = ["rank_index",
+                             "head_to_head",
+                             "rivals",
+                             "game_count",
+                             "last_game_id"]
+
     def __init__(self, name, identity_manager,
                  oldest_timestamp_to_consider=0,
+                 newest_timestamp_to_consider=None,
                  mingames=0,
                  leaderboard_msgs=None,
                  leaderboard_line=None,
                  description="A ranking",
+                 checkpoint_interval=500,
+                 max_checkpoints=3,
+                 rivals_min_games=9,
+                 rivals_min_win_rate=0.4,
+                 rivals_max_win_rate=0.6,
+                 form_length=15,
                  **kwargs):
         self.name = name
-        self.save_path = f"data/rankings/{name}.json"
+        self.checkpoint_dir = "data/rankings"
+        self.checkpoint_interval = checkpoint_interval
+        self.max_checkpoints = max_checkpoints
         self.oldest_timestamp_to_consider = oldest_timestamp_to_consider
+
+        if newest_timestamp_to_consider is None:
+            self.newest_timestamp_to_consider = inf
+        else:
+            self.newest_timestamp_to_consider = newest_timestamp_to_consider
         self.identity_manager = identity_manager
         self.mingames = mingames
         self.leaderboard_msgs = leaderboard_msgs
         self.leaderboard_line = leaderboard_line
         self.description = description
+        self.form_length = form_length
+        self.rivals_config = dict(min_games=rivals_min_games,
+                                  min_win_rate=rivals_min_win_rate,
+                                  max_win_rate=rivals_max_win_rate)
+
+        # Parameters influencing the result of the ranking. A checkpoint
+        # is only valid if they have not changed.
+        self.settings = dict(type=type(self).__name__,
+                             oldest_timestamp_to_consider=oldest_timestamp_to_consider,
+                             newest_timestamp_to_consider=newest_timestamp_to_consider,
+                             mingames=mingames,
+                             rivals=self.rivals_config,
+                             form_length=form_length)
+
+        self.reset()
 
-        self.wins = {}
-        self.wins_history = {}
-        self.rank_to_player = dict()
-        self.identity_to_player = dict()
+    def __getitem__(self, identity):
+        return self.identity_to_player[identity]
 
+    def add_missing_players(self):
+        """Create a player for every identity that doesn't have one yet."""
         for identity in self.identity_manager:
-            player = Player(identity, self.initial_player_state())
-            self.identity_to_player[identity] = player
+            if identity not in self.identity_to_player:
+                self.new_player(identity)
 
         self.alias_to_player = ChainedDict(self.identity_manager,
                                            self.identity_to_player)
 
-    def __getitem__(self, identity):
-        return self.identity_to_player[identity]
+    def check_game_count(self, count):
+        """Raise a `StaleCheckpointError` if the ranking includes more games
+        than the `count` games of the game log.
+        """
+        if self.game_count > count:
+            raise StaleCheckpointError(f"checkpoint includes {self.game_count} "
+                                       f"games but only {count} are known")
 
-    def asdict(self):
-        players = [p.asdict() for p in self.players]
-        return dict(name=self.name,
-                    players=players,
-                    wins=self.wins
-                    )
+    @property
+    def checkpoint_paths(self):
+        """Paths of the existing checkpoints of the ranking, newest first."""
+        paths = glob(os.path.join(self.checkpoint_dir,
+                                  f"{glob_escape(self.name)}-*.checkpoint"))
+        counts = {}
+
+        for path in paths:
+            count = os.path.basename(path)[len(self.name) + 1:-len(".checkpoint")]
+
+            if count.isdigit():
+                counts[path] = int(count)
+
+        return sorted(counts, key=counts.get, reverse=True)
+
+    def discard_checkpoint(self):
+        """Delete the checkpoint the ranking was restored from, after it was
+        found inconsistent with the game log, and reset the ranking.
+
+        Raise a `StaleCheckpointError` if the ranking was not restored from
+        a checkpoint, since the problem does not come from one then.
+        """
+        path = self.checkpoint_path
+
+        if path is None:
+            raise StaleCheckpointError("ranking was not restored from a checkpoint")
+
+        try:
+            os.remove(path)
+        except OSError:
+            logger.exception(f"Failed to delete checkpoint {path}.")
+
+        logger.info(f"Checkpoint {path} deleted.")
+        self.reset()
+
+    def drank_string(self, player, old_rank):
+        """String describing the rank change of a player after a game."""
+        # There are 3 potential scenarios:
+        # 1) a player was ranked None and continues to be None (X more games for rank assignment)
+        # 2) a player was ranked None and obtains a rank (⮝ to new rank)
+        # 3) a player rises or falls in an existing rank (⮝ or ⮞0 or ⮟)
+        rank = player.display_rank
+
+        # Scenario 1
+        if player.total_games < self.mingames:
+            return str(self.mingames - player.total_games) + " more games required"
+        # Scenario 2
+        elif player.total_games == self.mingames or old_rank is None:
+            return "▲" + str(rank)
+        # Scenario 3
+        elif rank == old_rank:
+            return "➤0"
+        elif rank < old_rank:  # they are placed higher
+            return "▲" + str(old_rank - rank)
+        else:  # they are placed lower
+            return "▼" + str(rank - old_rank)
 
     def ensure_alias_existence(self, alias):
         if alias not in self.identity_manager.aliases:
@@ -79,12 +191,46 @@ class AbstractRanking:
             identity = self.identity_manager[alias]
 
         if identity not in self.identity_to_player:
-            player = Player(identity, self.initial_player_state())
-            self.identity_to_player[identity] = player
+            self.new_player(identity)
+
+    @property
+    def history_dtype(self):
+        """NumPy type of the rows of the history of the players."""
+        return history_dtype(self.state_type)
+
+    def includes(self, game):
+        """Whether the game counts for the ranking."""
+        if game["winner"] in ("", None) or game["loser"] in ("", None):
+            return False
+
+        timestamp = game["timestamp"]
+
+        return (self.oldest_timestamp_to_consider < timestamp
+                <= self.newest_timestamp_to_consider)
 
     def initial_player_state(self):
         raise NotImplementedError()
 
+    def dump_state(self, file):
+        """Write the full state of the ranking to a binary file."""
+        dump_checkpoint(self, file)
+
+    def load_checkpoint(self, path):
+        """Restore the state of the ranking from a checkpoint file."""
+        with open(path, "rb") as file:
+            self.load_state(file)
+
+    def load_state(self, file):
+        """Restore the state of the ranking from a binary file written by
+        `dump_state`.
+
+        Raise a `StaleCheckpointError` if the state is not consistent with
+        the configuration of the ranking or the current identities.
+        Consistency with the game log is checked while replaying the log
+        with `replay_from`.
+        """
+        load_checkpoint(self, file)
+
     def leaderboard(self, start, stop):
         """Generate the string content of a leaderboard message."""
         # Convert from base 1 indexing for positive ranks
@@ -92,7 +238,7 @@ class AbstractRanking:
             start -= 1
 
         new_content = "\n".join([self.leaderboard_line.format(player=player)
-                                 for player in self.ranked_players[start:stop]])
+                                 for player in self.rank_index[start:stop]])
 
         return f"```\n{new_content}\n```"
 
@@ -114,14 +260,39 @@ class AbstractRanking:
 
         return msgs
 
+    def new_player(self, identity, state=None):
+        """Create and return the player associated with an identity.
+
+        Players are given consecutive integer ids, in order of creation.
+        """
+        if state is None:
+            state = self.initial_player_state()
+
+        player = Player(identity, state, History(self.history_dtype),
+                        form_length=self.form_length)
+        player.id = len(self.id_to_player)
+        player.rank_index = self.rank_index
+        self.id_to_player.append(player)
+        self.identity_to_player[identity] = player
+        return player
+
     @property
     def players(self):
-        return list(self.rank_to_player.values())
+        return list(self.rank_index)
 
-    def register_game(self, game):
-        if game["timestamp"] <= self.oldest_timestamp_to_consider:
+    def process_game(self, game):
+        """Update the state of the ranking with the result of a game.
+
+        Return the tuple `(winner, loser, winner_dscore, loser_dscore,
+        winner_old_rank, loser_old_rank)` or `None` if the game was ignored.
+        """
+        self.game_count += 1
+        self.last_game_id = game["id"]
+
+        if not self.includes(game):
             return None
 
+        timestamp = game["timestamp"]
         self.ensure_alias_existence(game["winner"])
         self.ensure_alias_existence(game["loser"])
 
@@ -131,31 +302,18 @@ class AbstractRanking:
         winner_old_score = winner.score
         loser_old_score = loser.score
 
-        if (winner, loser) not in self.wins:
-            self.wins[(winner, loser)] = 1
-        else:
-            self.wins[(winner, loser)] += 1
-
-        # calculate total games played and win % for allinfo rivals
-        total_played = self.wins[(winner, loser)] + self.wins.get((loser, winner), 0)
-        winner.games_against[loser] = loser.games_against[winner] = total_played
-        winner.win_percents[loser] = self.wins[(winner, loser)] / total_played
-        loser.win_percents[winner] = self.wins.get((loser, winner), 0) / total_played
+        self.head_to_head.add_game(winner.id, loser.id)
+        winner.recent_results.appendleft((True, loser.id))
+        loser.recent_results.appendleft((False, winner.id))
+        wins, losses = self.head_to_head.record(winner.id, loser.id)
+        self.rivals.update(winner.id, loser.id, wins, losses)
+        self.rivals.update(loser.id, winner.id, losses, wins)
 
-        invert_history = False
-        if (winner, loser) not in self.wins_history and (loser, winner) not in self.wins_history:
-            self.wins_history[(winner, loser)] = deque('1', maxlen=15)
-        elif (winner, loser) in self.wins_history:
-            self.wins_history[(winner, loser)].appendleft('1')
-        elif (loser, winner) in self.wins_history:
-            self.wins_history[(loser, winner)].appendleft('0')
-            invert_history = True
-
-        self.update_players(winner, loser, timestamp=game["timestamp"])
+        self.update_players(winner, loser, timestamp=timestamp)
 
         winner.current_win_streak += 1
         winner.current_lose_streak = 0
-        winner.longest_win_streak = max(winner.longest_win_streak, 
+        winner.longest_win_streak = max(winner.longest_win_streak,
                                         winner.current_win_streak)
         loser.current_lose_streak += 1
         loser.current_win_streak = 0
@@ -168,161 +326,250 @@ class AbstractRanking:
         winner_old_rank = winner.display_rank
         loser_old_rank = loser.display_rank
 
-        self.update_ranks(winner, winner_dscore, game["timestamp"])
-        self.update_ranks(loser, loser_dscore, game["timestamp"])
+        self.update_ranks(winner, timestamp)
+        self.update_ranks(loser, timestamp)
 
-        winner_rank = winner.display_rank
-        loser_rank = loser.display_rank
+        winner.record_game(self.game_count - 1, timestamp)
+        loser.record_game(self.game_count - 1, timestamp)
 
-        # There are 3 potential scenarios:
-        # 1) a player was ranked None and continues to be None (X more games for rank assignment)
-        # 2) a player was ranked None and obtains a rank (⮝ to new rank)
-        # 3) a player rises or falls in an existing rank (⮝ or ⮞0 or ⮟)
+        return (winner, loser,
+                winner_dscore, loser_dscore,
+                winner_old_rank, loser_old_rank)
 
-        # Scenario 1
-        if winner.total_games < self.mingames:
-            winner_drank = str(self.mingames - winner.total_games) + " more games required"
-        # Scenario 2
-        elif winner.total_games == self.mingames or winner_old_rank is None:
-            winner_drank = "▲" + str(winner_rank)
-            winner.delta_ranks[game["timestamp"]] = winner_rank
-        # Scenario 3
-        elif winner_rank == winner_old_rank:
-            winner_drank = "➤0"
-        elif winner_rank < winner_old_rank:  # they are placed higher
-            winner_drank = "▲" + str(abs(winner_old_rank - winner_rank))
-            winner.delta_ranks[game["timestamp"]] = -(winner_old_rank - winner_rank)
-        else:  # they are placed lower
-            winner_drank = "▼" + str(winner_rank - winner_old_rank)
-            winner.delta_ranks[game["timestamp"]] = (winner_rank - winner_old_rank)
+    def rebuild(self, make_games, chunk_size=1000):
+        """Bring the ranking up to date with the game log.
 
-        # Scenario 1
-        if loser.total_games < self.mingames:
-            loser_drank = str(self.mingames - loser.total_games) + " more games required"
-        # Scenario 2
-        elif loser.total_games == self.mingames or loser_old_rank is None:
-            loser_drank = "▲" + str(loser_rank)
-            loser.delta_ranks[game["timestamp"]] = loser_rank
-        # Scenario 3
-        elif loser_rank == loser_old_rank:
-            loser_drank = "➤0"
-        elif loser_rank > loser_old_rank:  # they have placed lower
-            loser_drank = "▼" + str(abs(loser_rank - loser_old_rank))
-            loser.delta_ranks[game["timestamp"]] = loser_rank - loser_old_rank
-        else:  # they have placed higher
-            loser_drank = "▲" + str(loser_old_rank - loser_rank)
-            loser.delta_ranks[game["timestamp"]] = -(loser_old_rank - loser_rank)
-
-        h2h_record = f"{self.wins.get((winner, loser),0)} – {self.wins.get((loser, winner),0)}"
-
-        if not invert_history:
-            h2h_history_len = len(self.wins_history[(winner, loser)])
-            h2h_history = "".join(self.wins_history[(winner, loser)])
-            h2h_history = h2h_history.replace("1", ":crown:").replace("0", ":meat_on_bone:")
-        elif invert_history:
-            h2h_history_len = len(self.wins_history[(loser, winner)])
-            h2h_history = "".join(self.wins_history[(loser, winner)])
-            h2h_history = h2h_history.replace("1", ":meat_on_bone:").replace("0", ":crown:")
+        `make_games` is a function returning a new iterator over the full
+        game log. The newest checkpoint is restored and only the games after
+        it are replayed. A checkpoint that turns out to be inconsistent with
+        the game log is deleted and the next newest one is tried, until none
+        is left and the ranking is rebuilt from scratch. A new checkpoint is
+        saved if any game was replayed.
+        """
+        while True:
+            restored_count = self.restore_checkpoint()
+
+            try:
+                self.replay_log(make_games(), chunk_size=chunk_size)
+                break
+
+            except StaleCheckpointError as err:
+                logger.warning(f"Checkpoint of ranking {self.name} discarded: {err}")
+                self.discard_checkpoint()
+
+        if self.game_count > restored_count:
+            self.save_checkpoint()
+
+    def register_game(self, game):
+        """Register a new game and return the associated `ScoreChange`,
+        or `None` if the game was ignored.
+
+        Use `replay` instead to register many games at once when the
+        `ScoreChange`s are not needed.
+        """
+        res = self.process_game(game)
+
+        if res is None:
+            return None
+
+        (winner, loser,
+         winner_dscore, loser_dscore,
+         winner_old_rank, loser_old_rank) = res
+
+        wins, losses = self.head_to_head.record(winner.id, loser.id)
+        h2h_record = f"{wins} – {losses}"
+
+        results = self.head_to_head.recent_results(winner.id, loser.id)
+        h2h_history_len = len(results)
+        h2h_history = "".join(":crown:" if won else ":meat_on_bone:"
+                              for won in results)
 
         change = ScoreChange(winner=winner,
                              loser=loser,
                              winner_dscore=winner_dscore,
                              loser_dscore=loser_dscore,
-                             winner_rank=winner_rank,
-                             loser_rank=loser_rank,
-                             winner_drank=winner_drank,
-                             loser_drank=loser_drank,
+                             winner_rank=winner.display_rank,
+                             loser_rank=loser.display_rank,
+                             winner_drank=self.drank_string(winner, winner_old_rank),
+                             loser_drank=self.drank_string(loser, loser_old_rank),
                              h2h_record=h2h_record,
                              h2h_history_len=h2h_history_len,
                              h2h_history=h2h_history)
 
         return change
 
-    @property
-    def ranked_players(self):
-        n = len(self.rank_to_player)
-        return [self.rank_to_player[k] for k in range(n)]
+    def replay(self, games):
+        """Register all the given games in order.
 
-    def update_players(self, winner, loser, timestamp=None):
-        raise NotImplementedError()
+        Equivalent to calling `register_game` for each game, but skip all
+        the work only needed to display the results.
+        """
+        process_game = self.process_game
 
-    def update_ranks(self, player, dscore, timestamp):
-        if player.total_games < self.mingames:
-            return
+        for game in games:
+            process_game(game)
+
+    def replay_from(self, games, position, index=None):
+        """Replay a slice of the game log starting at `position`, skipping
+        the games already included in the ranking.
+
+        Only the games in the time window of the ranking are replayed,
+        found using the `TimestampIndex` of the slice (created if not given).
+
+        Raise a `StaleCheckpointError` if the games already included do not
+        match the game log.
+        """
+        skip = self.game_count - position
+
+        if skip < 0:
+            raise StaleCheckpointError(f"games before position {position} are missing")
+
+        if 0 < skip <= len(games) and games[skip - 1]["id"] != self.last_game_id:
+            raise StaleCheckpointError("game log does not match")
 
-        if dscore == 0:
+        if skip >= len(games):
             return
-        elif dscore < 0:
-            inc = 1
-        else:
-            inc = -1
 
-        N = len(self.rank_to_player)
+        if index is None:
+            index = TimestampIndex(games)
+
+        start, stop = index.window(self.oldest_timestamp_to_consider,
+                                   self.newest_timestamp_to_consider)
+        start = max(start, skip)
+        stop = max(stop, start)
+
+        # Games outside of the window are only counted
+        if start > skip:
+            self.game_count += start - skip
+            self.last_game_id = games[start - 1]["id"]
+
+        self.replay(games[start:stop])
+
+        if stop < len(games):
+            self.game_count += len(games) - stop
+            self.last_game_id = games[-1]["id"]
+
+    def replay_log(self, games, chunk_size=1000):
+        """Replay the full game log from its first game, by chunks, skipping
+        the games already included in the ranking.
+
+        Raise a `StaleCheckpointError` if the games already included do not
+        match the game log.
+        """
+        position = 0
 
-        if N == 0:
-            player.rank = 0
-            self.rank_to_player[0] = player
+        for chunk in chunks(games, chunk_size):
+            self.replay_from(chunk, position)
+            position += len(chunk)
+
+        self.check_game_count(position)
+
+    def reset(self):
+        """Reset the ranking to its initial state, without any game."""
+        # Number of games and id of the last game given to the ranking,
+        # including the one that were ignored.
+        self.game_count = 0
+        self.last_game_id = None
+
+        # Path of the checkpoint the ranking was restored from, if any
+        self.checkpoint_path = None
+
+        self.head_to_head = HeadToHead()
+        self.rivals = Rivals(**self.rivals_config)
+        self.rank_index = RankIndex()
+        self.identity_to_player = dict()
+        self.id_to_player = []
+
+        self.add_missing_players()
+
+    def restore_checkpoint(self):
+        """Restore the newest checkpoint consistent with the configuration
+        of the ranking and the current identities.
+
+        Return the number of games included in the restored checkpoint, or
+        0 if no valid checkpoint was found, in which case the ranking is
+        unchanged.
+        """
+        for path in self.checkpoint_paths:
+            try:
+                self.load_checkpoint(path)
+            except StaleCheckpointError as err:
+                logger.warning(f"Checkpoint {path} ignored: {err}")
+                continue
+            except (OSError, ValueError, zipfile.BadZipFile,
+                    pickle.UnpicklingError, EOFError,
+                    AttributeError, KeyError) as err:
+                logger.warning(f"Checkpoint {path} is corrupted: {err!r}")
+                continue
+
+            self.checkpoint_path = path
+            logger.info(f"Ranking {self.name} restored from {path} "
+                        f"({self.game_count} games).")
+            return self.game_count
+
+        logger.info(f"No valid checkpoint found for ranking {self.name}.")
+        return 0
+
+    def save_checkpoint(self):
+        """Save the current state of the ranking to a new checkpoint file
+        and delete the oldest ones.
+
+        Checkpoints are optional, so errors are logged and not raised.
+        """
+        if self.game_count == 0:
             return
 
-        old_rank = player.rank
+        path = os.path.join(self.checkpoint_dir,
+                            f"{self.name}-{self.game_count}.checkpoint")
+
+        # Write to a temporary file first, so that a crash can not leave
+        # a truncated checkpoint behind
+        try:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
 
-        if old_rank is None:
-            inc = -1
-            old_rank = N
-            N += 1
+            with open(path + ".tmp", "wb") as file:
+                self.dump_state(file)
+
+            os.replace(path + ".tmp", path)
+        except (OSError, pickle.PicklingError):
+            logger.exception(f"Failed to save checkpoint {path}.")
+
+            try:
+                os.remove(path + ".tmp")
+            except OSError:
+                pass
 
-        if inc == -1 and old_rank == 0:
             return
 
-        if inc == 1 and old_rank == N - 1:
+        logger.info(f"Checkpoint {path} saved.")
+
+        for old_path in self.checkpoint_paths[self.max_checkpoints:]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                logger.exception(f"Failed to delete checkpoint {old_path}.")
+
+    def update_players(self, winner, loser, timestamp=None):
+        raise NotImplementedError()
+
+    def update_ranks(self, player, timestamp):
+        """Move the player in the rank index after its score changed, and
+        update the best ranks.
+
+        A player is ranked as soon as it reaches `mingames`, even if its
+        last game didn't change its score (e.g. an Eel loss at score 0).
+        """
+        if player.total_games < self.mingames:
             return
 
-        k = old_rank + inc
+        old_rank = player.rank
+        self.rank_index.update(player, player.score)
+        rank = player.rank
 
-        other = self.rank_to_player[k]
+        # The players passed by a player going down each gain a rank
+        if old_rank is not None and rank > old_rank:
+            for other_rank, other in enumerate(self.rank_index[old_rank:rank],
+                                               old_rank):
+                other.update_best_rank(other_rank, timestamp)
 
-        while k > 0 and k < N - 1 and other.score*inc > player.score*inc:
-            other.rank = k - inc
-            self.rank_to_player[other.rank] = other
-            if timestamp not in other.delta_ranks.keys():
-                other.delta_ranks[timestamp] = -inc
-            else:
-                other.delta_ranks[timestamp] += -inc
-
-            k += inc
-            other = self.rank_to_player[k]
-
-        other_score = other.score
-        player_score = player.score
-        if other_score*inc > player_score*inc:
-            other.rank = k - inc
-            self.rank_to_player[other.rank] = other
-            if timestamp not in other.delta_ranks.keys():
-                other.delta_ranks[timestamp] = -inc
-            else:
-                other.delta_ranks[timestamp] += -inc
-        else:
-            k -= inc
-
-        player.rank = k
-        self.rank_to_player[k] = player
-
-        if k > 0:
-            if player_score > self.rank_to_player[k - 1].score:
-                for rank, player in self.rank_to_player.items():
-                    print(f"{rank}    : {player}")
-                raise Exception(
-                    f"{player} not reranked correctly from {old_rank}"
-                    f"(dscore = {dscore}, inc = {inc}).")
-
-        if k < N - 1:
-            if player_score < self.rank_to_player[k + 1].score:
-                for rank, player in self.rank_to_player.items():
-                    print(f"{rank}    : {player}")
-                raise Exception(
-                    f"{player} not reranked correctly from {old_rank}"
-                    f"(dscore = {dscore}, inc = {inc}).")
-
-    def save(self):
-        with open(self.save_path, "w", encoding="utf-8") as file:
-            json.dump([p.asdict() for p in self.players], file)
+        player.update_best_rank(rank, timestamp)
@@ -0,0 +1,113 @@
+import asyncio
+import io
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from save_and_load import TimestampIndex, iter_saved_games
+from utils import async_chunks, logger
+
+from .checkpoint import StaleCheckpointError
+
+
+def rebuild_in_worker(ranking_type, name, identity_manager, config, backend):
+    """Build a ranking from the saved game log and return its state as bytes.
+
+    Run in a worker process, the returned state is meant to be loaded with
+    `AbstractRanking.load_state` in the main process.
+    """
+    from . import ranking_types
+
+    ranking = ranking_types[ranking_type](name, identity_manager, **config)
+    ranking.rebuild(partial(iter_saved_games, backend=backend))
+
+    buffer = io.BytesIO()
+    ranking.dump_state(buffer)
+    return buffer.getvalue()
+
+
+async def rebuild_in_parallel(rankings, configs, backend="csv",
+                              max_workers=None):
+    """Rebuild all the given rankings from the saved game log, each in its
+    own process.
+
+    `rankings` maps ranking names to freshly created rankings and `configs`
+    maps the names to the configuration used to create them. The rankings
+    are updated in place with the state built by the workers.
+    """
+    if max_workers is None:
+        max_workers = len(rankings)
+
+    loop = asyncio.get_running_loop()
+    identity_manager = next(iter(rankings.values())).identity_manager
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+
+        for name, ranking in rankings.items():
+            # Leaderboard messages hold discord objects that can not be
+            # sent to other processes, and are not needed there
+            config = {key: value for key, value in configs[name].items()
+                      if key not in ["type", "leaderboard_msgs"]}
+
+            futures[name] = loop.run_in_executor(
+                                executor,
+                                rebuild_in_worker,
+                                configs[name]["type"],
+                                name,
+                                identity_manager,
+                                config,
+                                backend)
+
+        for name, future in futures.items():
+            state = await future
+            rankings[name].load_state(io.BytesIO(state))
+            logger.info(f"Ranking {name} rebuilt in worker process.")
+
+
+async def rebuild_rankings(rankings, game_stream, make_saved_games,
+                           chunk_size=1000):
+    """Rebuild all the given rankings in a single pass over the game log.
+
+    `game_stream` asynchronously iterates over the full game log and is
+    consumed by chunks, so that the log is never fully loaded in memory.
+    Each ranking starts from its newest checkpoint. The checkpoints that
+    turn out to be inconsistent with the game log are deleted, and those
+    rankings are rebuilt with `AbstractRanking.rebuild` from their next
+    newest checkpoint, using `make_saved_games`, a function returning a new
+    iterator over the saved game log.
+    """
+    restored_counts = {name: ranking.restore_checkpoint()
+                       for name, ranking in rankings.items()}
+    stale = {}
+    position = 0
+
+    async for games in async_chunks(game_stream, chunk_size):
+        index = TimestampIndex(games)
+
+        for name, ranking in rankings.items():
+            if name in stale:
+                continue
+
+            try:
+                ranking.replay_from(games, position, index=index)
+            except StaleCheckpointError as err:
+                stale[name] = err
+
+        position += len(games)
+
+    for name, ranking in rankings.items():
+        if name not in stale:
+            try:
+                ranking.check_game_count(position)
+            except StaleCheckpointError as err:
+                stale[name] = err
+
+    for name, err in stale.items():
+        logger.warning(f"Checkpoint of ranking {name} discarded: {err}")
+        rankings[name].discard_checkpoint()
+        rankings[name].rebuild(make_saved_games, chunk_size=chunk_size)
+
+    for name, ranking in rankings.items():
+        if name not in stale and ranking.game_count > restored_counts[name]:
+            ranking.save_checkpoint()
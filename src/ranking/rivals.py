@@ -0,0 +1,55 @@
+from sortedcontainers import SortedList
+
+
+class Rivals:
+    """Rivals of the players of a ranking, indexed by player id.
+
+    A rival of a player is an opponent against which they played at least
+    `min_games` games, with a win rate strictly between `min_win_rate` and
+    `max_win_rate`. Rivals are sorted by number of games played, then by
+    closeness of the win rate to 50 %.
+    """
+    def __init__(self, min_games=9, min_win_rate=0.4, max_win_rate=0.6):
+        self.min_games = min_games
+        self.min_win_rate = min_win_rate
+        self.max_win_rate = max_win_rate
+
+        # Dict opponent id -> entry and sorted entries, for each player id.
+        # Entries are tuples (-games, distance to 50 %, opponent id, wins, losses).
+        self.entries = {}
+        self.sorted_entries = {}
+
+    def top(self, player_id, n=5):
+        """The `n` first rivals of a player, as tuples
+        `(opponent id, wins, losses)`.
+        """
+        entries = self.sorted_entries.get(player_id, [])
+        return [entry[2:] for entry in entries[:n]]
+
+    def update(self, player_id, opponent_id, wins, losses):
+        """Update the rivals of a player after its record against an
+        opponent changed.
+        """
+        if player_id == opponent_id:
+            return
+
+        old_entry = self.entries.get(player_id, {}).pop(opponent_id, None)
+
+        if old_entry is not None:
+            self.sorted_entries[player_id].remove(old_entry)
+
+        games = wins + losses
+
+        if games < self.min_games:
+            return
+
+        win_rate = wins/games
+
+        if self.min_win_rate < win_rate < self.max_win_rate:
+            if player_id not in self.entries:
+                self.entries[player_id] = {}
+                self.sorted_entries[player_id] = SortedList()
+
+            entry = (-games, abs(0.5 - win_rate), opponent_id, wins, losses)
+            self.entries[player_id][opponent_id] = entry
+            self.sorted_entries[player_id].add(entry)
@@ -16,30 +16,31 @@ Comparison = namedtuple("Comparison", ["wins",
 
 
 class TrueSkillState(AbstractState):
-    def __init__(self, rating, rank=None, wins=0, losses=0):
-        self.rank = rank
+    __slots__ = ["mu", "sigma"]
+    fields = dict(AbstractState.fields, mu="f8", sigma="f8")
+
+    def __init__(self, mu, sigma, wins=0, losses=0):
         self.wins = wins
         self.losses = losses
-        self.rating = rating
+        self.mu = mu
+        self.sigma = sigma
 
     @property
-    def mu(self):
-        return self.rating.mu
+    def rating(self):
+        return trueskill.Rating(mu=self.mu, sigma=self.sigma)
 
     @property
     def score(self):
         return self.mu - 3*self.sigma
 
-    @property
-    def sigma(self):
-        return self.rating.sigma
-
     @property
     def variance(self):
         return self.sigma**2
 
 
 class TrueSkillRanking(AbstractRanking):
+    state_type = TrueSkillState
+
     def __init__(self, name, identity_manager,
                  mu=25, sigma=25/3, beta=25/6, tau=25/300,
                  **kwargs):
@@ -53,9 +54,10 @@ class TrueSkillRanking(AbstractRanking):
 
         super().__init__(name, identity_manager, **kwargs)
 
+        self.settings.update(mu=mu, sigma=sigma, beta=beta, tau=tau)
+
     def comparison(self, p1, p2):
-        wins = self.wins.get((p1, p2), 0)
-        losses = self.wins.get((p2, p1), 0)
+        wins, losses = self.head_to_head.record(p1.id, p2.id)
         if wins + losses == 0:
             return None
 
@@ -66,23 +68,21 @@ class TrueSkillRanking(AbstractRanking):
                           win_estimate=100*self.win_estimate(p1, p2))
 
     def initial_player_state(self):
-        return TrueSkillState(self.ts_env.Rating())
+        return TrueSkillState(self.ts_env.mu, self.ts_env.sigma)
 
     def update_players(self, winner, loser, timestamp=None):
         wrating, lrating = self.ts_env.rate_1vs1(winner.state.rating,
                                                  loser.state.rating)
 
-        wstate = TrueSkillState(wrating,
-                                rank=winner.rank,
+        wstate = TrueSkillState(wrating.mu, wrating.sigma,
                                 wins=winner.wins + 1,
                                 losses=winner.losses)
-        winner.update_state(wstate, timestamp)
+        winner.update_state(wstate)
 
-        lstate = TrueSkillState(lrating,
-                                rank=loser.rank,
+        lstate = TrueSkillState(lrating.mu, lrating.sigma,
                                 wins=loser.wins,
                                 losses=loser.losses + 1)
-        loser.update_state(lstate, timestamp)
+        loser.update_state(lstate)
 
     def win_estimate(self, p1, p2):
         delta_mu = p1.mu - p2.mu
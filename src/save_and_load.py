@@ -1,10 +1,16 @@
+import asyncio
 import csv
 import json
+import numpy as np
+import os
 import re
 
+from bisect import bisect_right
 from collections import OrderedDict
+from itertools import islice
+from math import inf
 
-from utils import locking, logger
+from utils import async_chunks, chunks, locking, logger
 
 ## Parsing
 
@@ -69,10 +75,244 @@ def parse_mention_to_id(mention):
     return int(m.group(1))
 
 
+## Binary game log
+
+# Fixed size record of the binary game log. Winner and loser are indices in
+# the alias table of the log.
+GAME_RECORD_DTYPE = np.dtype([("timestamp", "<f8"),
+                              ("id", "<u8"),
+                              ("winner", "<u4"),
+                              ("loser", "<u4")])
+
+NO_ALIAS = np.iinfo(GAME_RECORD_DTYPE["winner"]).max  # Missing winner or loser
+
+
+class BinaryGameLog:
+    """Append-only game log with fixed size records.
+
+    Player names are interned: they are stored only once in an alias table
+    (one alias per line in a text file) and the records refer to them by
+    index. The records can be read as a NumPy structured array without
+    creating any Python object per game.
+    """
+    def __init__(self, path="data/raw_results.bin",
+                 alias_path="data/raw_results_aliases.txt"):
+        self.path = path
+        self.alias_path = alias_path
+        self.aliases = []
+        self.alias_to_id = {}
+
+        try:
+            with open(self.alias_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    self.intern(line.rstrip("\n"))
+        except FileNotFoundError:
+            pass
+
+    def __iter__(self):
+        return self.iter_games()
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.path) // GAME_RECORD_DTYPE.itemsize
+        except FileNotFoundError:
+            return 0
+
+    def append(self, games, fsync=False):
+        """Append the games to the log.
+
+        If `fsync` is true, the data are written to disk before returning.
+
+        If writing fails, the files are cut back to their previous size and
+        the alias table is left unchanged, so that the games can be appended
+        again later.
+        """
+        records = np.empty(len(games), dtype=GAME_RECORD_DTYPE)
+        new_aliases = {}  # Aliases not in the table yet, with their future index
+
+        for k, game in enumerate(games):
+            records[k] = (game["timestamp"],
+                          game["id"],
+                          self.intern(game["winner"], new_aliases),
+                          self.intern(game["loser"], new_aliases))
+
+        # New aliases are written first, so that records never refer to
+        # an alias missing from the table
+        if len(new_aliases) > 0:
+            lines = "".join(alias + "\n" for alias in new_aliases)
+            append_or_truncate(self.alias_path, lines, "a", fsync=fsync,
+                               encoding="utf-8")
+
+        append_or_truncate(self.path, records.tobytes(), "ab", fsync=fsync)
+
+        # Only added once written, so that a failed write leaves no alias
+        # that is used but missing from the file
+        for alias in new_aliases:
+            self.alias_to_id[alias] = len(self.aliases)
+            self.aliases.append(alias)
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def intern(self, alias, new_aliases=None):
+        """Return the index of the alias in the alias table.
+
+        An alias not in the table is added to it, or to the dict
+        `new_aliases` if given.
+        """
+        if alias in ("", None):
+            return NO_ALIAS
+
+        alias = clean_name(alias)
+
+        if alias in self.alias_to_id:
+            return self.alias_to_id[alias]
+
+        if new_aliases is None:
+            self.alias_to_id[alias] = len(self.aliases)
+            self.aliases.append(alias)
+            return self.alias_to_id[alias]
+
+        if alias not in new_aliases:
+            new_aliases[alias] = len(self.aliases) + len(new_aliases)
+
+        return new_aliases[alias]
+
+    def iter_games(self, chunk_size=10000):
+        """Iterate over the games of the log as game dicts.
+
+        Records are converted by chunks, a column at a time, and alias ids
+        are mapped to aliases with a NumPy array of the alias table.
+        """
+        records = self.records()
+
+        # The last element stands for `NO_ALIAS`
+        names = np.array(self.aliases + [None], dtype=object)
+
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            winner_ids = chunk["winner"].astype(np.int64)
+            loser_ids = chunk["loser"].astype(np.int64)
+            winner_ids[winner_ids == NO_ALIAS] = len(self.aliases)
+            loser_ids[loser_ids == NO_ALIAS] = len(self.aliases)
+
+            for timestamp, game_id, winner, loser in zip(
+                    chunk["timestamp"].tolist(),
+                    chunk["id"].tolist(),
+                    names[winner_ids].tolist(),
+                    names[loser_ids].tolist()):
+                yield dict(timestamp=timestamp, id=game_id,
+                           winner=winner, loser=loser)
+
+    def records(self):
+        """Structured array of all records, memory mapped from the file."""
+        # An incomplete trailing record (from an interrupted write) is ignored
+        n = len(self)
+
+        if n == 0:
+            return np.empty(0, dtype=GAME_RECORD_DTYPE)
+
+        return np.memmap(self.path, dtype=GAME_RECORD_DTYPE,
+                         mode="r", shape=(n,))
+
+
+def append_or_truncate(path, data, mode, fsync=False, **kwargs):
+    """Append the data to the file.
+
+    If writing fails, the file is cut back to its previous size before the
+    error is raised again, so that no partial line or record is left.
+    """
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        size = 0
+
+    try:
+        with open(path, mode, **kwargs) as file:
+            file.write(data)
+
+            if fsync:
+                sync_file(file)
+    except OSError:
+        try:
+            if os.path.exists(path):
+                os.truncate(path, size)
+        except OSError:
+            logger.exception(f"Failed to remove partial write from {path}.")
+
+        raise
+
+
+def migrate_csv_to_binary(game_log=None, chunk_size=10000):
+    """Copy all games from the CSV game log to a binary game log."""
+    if game_log is None:
+        game_log = BinaryGameLog()
+
+    logger.info(f"Migrating raw_results.csv to binary game log {game_log.path}.")
+
+    for games in chunks(iter_saved_games(backend="csv"), chunk_size):
+        game_log.append(games)
+
+    logger.info(f"{len(game_log)} games migrated to binary game log.")
+
+    return game_log
+
+
+binary_game_logs = {}  # Binary game logs already opened, by path.
+
+
+def open_binary_game_log(path="data/raw_results.bin"):
+    """Open the binary game log, creating it from the CSV game log if
+    it doesn't exist yet.
+
+    The log is opened only once, later calls return the same object.
+    """
+    if path not in binary_game_logs:
+        game_log = BinaryGameLog(path)
+
+        if not game_log.exists and os.path.exists("data/raw_results.csv"):
+            migrate_csv_to_binary(game_log=game_log)
+
+        binary_game_logs[path] = game_log
+
+    return binary_game_logs[path]
+
+
+## Timestamp index
+
+class TimestampIndex:
+    """Index of a sequence of games by timestamp.
+
+    Allow to find the games in a time window with a binary search, if the
+    games are sorted by timestamp (which is the case of the game log).
+    """
+    def __init__(self, games):
+        self.n = len(games)
+        self.timestamps = [game["timestamp"] for game in games]
+        self.is_sorted = all(t1 <= t2 for t1, t2 in zip(self.timestamps,
+                                                        self.timestamps[1:]))
+
+    def window(self, oldest=-inf, newest=inf):
+        """Return the indices `start, stop` such that the games in
+        `games[start:stop]` are the ones with `oldest < timestamp <= newest`.
+
+        If the games are not sorted, the whole sequence is returned.
+        """
+        if not self.is_sorted:
+            return 0, self.n
+
+        start = bisect_right(self.timestamps, oldest)
+        stop = bisect_right(self.timestamps, newest, lo=start)
+        return start, stop
+
+
 ## File reading/writing
 
 async def fetch_game_results(matchboard, after=None):
-    game_results = []
+    """Asynchronously iterate over the games published in the matchboard
+    after the given message.
+    """
     history = matchboard.history(oldest_first=True,
                                  after=after,
                                  limit=None)
@@ -83,17 +323,29 @@ async def fetch_game_results(matchboard, after=None):
         if game is None:
             continue
 
-        game_results.append(game)
+        yield game
 
-    return game_results
 
+async def stream_game_results(matchboard, backend="csv", batch_size=100):
+    """Asynchronously iterate over all games.
 
-async def get_game_results(matchboard):
+    Saved games are first read lazily from disk, then the games missing
+    from the matchboard are fetched. The new games are saved before being
+    yielded.
+    """
     # First retrieve saved games.
-    loaded_results = await load_game_results()
+    logger.info("Retrieving saved games.")
+    last_id = None
+    n_saved = 0
 
-    if len(loaded_results) > 0:
-        last_id = int(loaded_results[-1]["id"])
+    for game in iter_saved_games(backend=backend):
+        last_id = game["id"]
+        n_saved += 1
+        yield game
+
+    logger.info(f"{n_saved} game results retrieved from save.")
+
+    if last_id is not None:
         last_message = await matchboard.fetch_message(last_id)
     else:
         last_message = None
@@ -101,34 +353,36 @@ async def get_game_results(matchboard):
     # Second fetch messages not yet saved from the matchboard.
     # New results are directly saved.
     logger.info("Fetching missing results from matchboard.")
+    n_fetched = 0
 
-    fetched_game_results = await fetch_game_results(matchboard, after=last_message)
+    async for games in async_chunks(fetch_game_results(matchboard,
+                                                       after=last_message),
+                                    batch_size):
+        await save_games(games, backend=backend)
+        n_fetched += len(games)
 
-    logger.info(f"{len(fetched_game_results)} new results fetched from matchboard.")
+        for game in games:
+            yield game
 
-    await save_games(fetched_game_results)
+    logger.info(f"{n_fetched} new results fetched from matchboard.")
 
-    return loaded_results + fetched_game_results
 
+def get_current_form(player, lookback_depth=None, multiline=False):
+    """Return the string representing the results of the last games of the
+    player, and the number of games it contains.
 
-def get_current_form(player, lookback_depth=10, multiline=False):
-    # get current record of the player
-    no_of_games = min(player.total_games, lookback_depth)
-    wins = player.wins
-    losses = player.losses
+    At most `lookback_depth` games are included, by default all the recent
+    results kept by the player.
+    """
+    results = list(islice(player.recent_results, lookback_depth))
+    no_of_games = len(results)
 
     current_form_list = []
-    for t in reversed(player.times[-no_of_games:]):  # get the times of the last games played
-        # get record of the current time state
-        tstate_wins = player.saved_states[t].wins
-        tstate_losses = player.saved_states[t].losses
-        if tstate_wins < wins:  # player has won the previous game
+    for won, opponent_id in results:
+        if won:
             current_form_list.append(":crown:")
-        elif tstate_losses < losses:  # player has lost the previous game
+        else:
             current_form_list.append(":meat_on_bone:")
-        # update record for the next iteration
-        wins = tstate_wins
-        losses = tstate_losses
 
     if (no_of_games > 10 and multiline):
         last_row = no_of_games // 10
@@ -150,14 +404,18 @@ def game_results_writer(file):
     return csv.DictWriter(file, fieldnames=["timestamp", "id", "winner", "loser"])
 
 
-@locking("raw_results.csv")
-async def load_game_results():
+def iter_saved_games(backend="csv"):
+    """Iterate lazily over the saved games, in the order they were saved."""
+    if backend == "binary":
+        yield from open_binary_game_log()
+        return
+
     try:
-        logger.info("Retrieving saved games.")
         with open("data/raw_results.csv", "r", encoding="utf-8", newline="") as file:
-            game_results = list(csv.DictReader(file))
-
-            logger.info(f"{len(game_results)} game results retrieved from save.")
+            for game in csv.DictReader(file):
+                game["timestamp"] = float(game["timestamp"])
+                game["id"] = int(game["id"])
+                yield game
 
     except FileNotFoundError:
         logger.warning("File `raw_results.csv` not found, creating a new one.")
@@ -165,12 +423,26 @@ async def load_game_results():
         with open("data/raw_results.csv", "w", encoding="utf-8", newline="") as file:
             writer = game_results_writer(file)
             writer.writeheader()
-            game_results = []
 
-    for k, game in enumerate(game_results):
-        game_results[k]["timestamp"] = float(game["timestamp"])
 
-    return game_results
+def load_bot_config():
+    """Load the general configuration of the bot, using default values
+    for missing entries.
+    """
+    config = dict(display_name_concurrency=10,
+                  display_name_refresh_interval=6*3600,
+                  game_log="csv",
+                  game_log_flush_interval=5,
+                  game_log_fsync=False,
+                  parallel_replay=False)
+
+    try:
+        with open("config/bot_config.json", "r", encoding="utf-8") as file:
+            config.update(json.load(file))
+    except FileNotFoundError:
+        logger.warning("File `bot_config.json` not found, using default configuration.")
+
+    return config
 
 
 def load_ranking_configs():
@@ -186,7 +458,26 @@ def load_tokens():
 
 
 @locking("raw_results.csv")
-async def save_games(games):
+async def save_games(games, backend="csv"):
+    write_games(games, backend=backend)
+
+
+def sync_file(file):
+    """Make sure everything written to the file is on disk."""
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def write_games(games, backend="csv", fsync=False):
+    """Append the games to the game log.
+
+    Do not acquire the lock of the game log, use `save_games` or a
+    `GameLogWriter` instead.
+    """
+    if backend == "binary":
+        open_binary_game_log().append(games, fsync=fsync)
+        return
+
     with open("data/raw_results.csv", "a",
               encoding="utf-8", newline="") as file:
         writer = game_results_writer(file)
@@ -194,9 +485,60 @@ async def save_games(games):
         for game in games:
             writer.writerow(game)
 
+        if fsync:
+            sync_file(file)
 
-def save_single_game(game):
-    with open("data/raw_results.csv", "a",
-              encoding="utf-8", newline="") as file:
-        writer = game_results_writer(file)
-        writer.writerow(game)
+
+class GameLogWriter:
+    """Write new games to the game log by batches.
+
+    Games added to the writer are queued and written from a background task
+    every `flush_interval` seconds (or immediately if it is 0), holding the
+    lock of the game log. If `fsync` is true, each batch is forced to disk
+    before the next one is written.
+    """
+    def __init__(self, backend="csv", flush_interval=5, fsync=False):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.pending = []
+        self.task = None
+
+    def add(self, game):
+        """Queue a game to be written to the game log."""
+        self.pending.append(game)
+
+        if self.flush_interval == 0:
+            asyncio.ensure_future(self.flush())
+
+    async def close(self):
+        """Stop the background task and write all pending games."""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        await self.flush()
+
+    @locking("raw_results.csv")
+    async def flush(self):
+        """Write all pending games to the game log."""
+        if len(self.pending) == 0:
+            return
+
+        games, self.pending = self.pending, []
+
+        try:
+            write_games(games, backend=self.backend, fsync=self.fsync)
+        except OSError:
+            logger.exception(f"Failed to write {len(games)} games to the game log.")
+            self.pending = games + self.pending
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        """Start writing the queued games periodically in the background."""
+        if self.flush_interval > 0 and self.task is None:
+            self.task = asyncio.ensure_future(self.run())
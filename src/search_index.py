@@ -0,0 +1,159 @@
+from collections import Counter
+from difflib import SequenceMatcher
+
+
+def trigrams(name):
+    """Set of the character trigrams of a name, ignoring case.
+
+    The name is padded with spaces, so that names shorter than three
+    characters have trigrams and the start of the name weighs more.
+    """
+    padded = f"  {name.lower()} "
+    return {padded[k:k+3] for k in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Index of names by their character trigrams, for fuzzy search.
+
+    Searching only looks at the names sharing trigrams with the query.
+    The names sharing the most of them are then sorted by similarity ratio,
+    as `difflib.get_close_matches` does.
+
+    Removed names are only marked as such, and skipped when found.
+    """
+    def __init__(self, names=()):
+        self.name_to_id = {}
+        self.names = []  # Name of each id, or None if it was removed
+        self.postings = {}  # List of the ids of the names with each trigram
+
+        for name in names:
+            self.add(name)
+
+    def __contains__(self, name):
+        return name in self.name_to_id
+
+    def __len__(self):
+        return len(self.name_to_id)
+
+    def add(self, name):
+        if name in self.name_to_id:
+            return
+
+        name_id = len(self.names)
+        self.name_to_id[name] = name_id
+        self.names.append(name)
+
+        for trigram in trigrams(name):
+            self.postings.setdefault(trigram, []).append(name_id)
+
+    def remove(self, name):
+        name_id = self.name_to_id.pop(name, None)
+
+        if name_id is not None:
+            self.names[name_id] = None
+
+    def search(self, query, n=5, cutoff=0.6, candidates=50):
+        """Return up to `n` names close to the query, from the closest.
+
+        Only the `candidates` names sharing the most trigrams with the query
+        are compared to it, and names with a similarity ratio below `cutoff`
+        are ignored.
+        """
+        counts = Counter()
+
+        for trigram in trigrams(query):
+            counts.update(self.postings.get(trigram, ()))
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query.lower())
+        matches = []
+
+        for name_id, _ in counts.most_common(max(n, candidates)):
+            name = self.names[name_id]
+
+            if name is None:
+                continue
+
+            matcher.set_seq1(name.lower())
+            ratio = matcher.ratio()
+
+            if ratio >= cutoff:
+                matches.append((ratio, name))
+
+        matches.sort(key=lambda match: match[0], reverse=True)
+        return [name for _, name in matches[:n]]
+
+
+class WordTrie:
+    """Trie of names made of words separated by spaces, with one node per
+    word, used to split a sequence of words in names.
+    """
+    def __init__(self, names=()):
+        # Nodes are dicts word -> child node, the key None marking the end
+        # of a name
+        self.root = {}
+
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        node = self.root
+
+        for word in name.split(" "):
+            node = node.setdefault(word, {})
+
+        node[None] = True
+
+    def ends(self, words, start):
+        """Yield the positions `end` such that `words[start:end]` form a
+        name, in increasing order.
+        """
+        node = self.root
+
+        for end in range(start, len(words)):
+            node = node.get(words[end])
+
+            if node is None:
+                return
+
+            if None in node:
+                yield end + 1
+
+    def segmentations(self, words, n, limit=None):
+        """Return the ways to split the words in `n` consecutive names,
+        as lists of names, up to `limit` of them.
+
+        The number of ways to split the words from each position in each
+        number of names is first computed from the end, in time linear in
+        the number of words for names of bounded length. Only the splits
+        that succeed are then built.
+        """
+        k = len(words)
+        ends = [list(self.ends(words, start)) for start in range(k)]
+
+        # ways[j][i] is the number of ways to split words[i:] in j names
+        ways = [[0]*(k + 1) for _ in range(n + 1)]
+        ways[0][k] = 1
+
+        for j in range(1, n + 1):
+            for i in range(k):
+                ways[j][i] = sum(ways[j - 1][end] for end in ends[i])
+
+        splits = []
+
+        def build(start, j, names):
+            if limit is not None and len(splits) >= limit:
+                return
+
+            if j == 0:
+                splits.append(names)
+                return
+
+            for end in ends[start]:
+                if ways[j - 1][end] > 0:
+                    build(end, j - 1, names + [" ".join(words[start:end])])
+
+        if ways[n][0] > 0:
+            build(0, n, [])
+
+        return splits
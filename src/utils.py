@@ -93,12 +93,33 @@ class ChainedDict:
         return self.mid_to_value[self.key_to_mid[key]]
 
 
-def partition(N, parts=2):
-    """Return all partition of integer `N` in a fixed number of parts."""
-
-    if parts == 1:
-        yield (N,)
-    else:
-        for i in range(1, N):
-            for p in partition(N - i, parts - 1):
-                yield (i,) + p
+def chunks(iterable, size):
+    """Iterate over lists of `size` consecutive elements of `iterable`
+    (the last one may be shorter).
+    """
+    chunk = []
+
+    for element in iterable:
+        chunk.append(element)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
+
+async def async_chunks(aiterable, size):
+    """Asynchronous version of `chunks`, for asynchronous iterables."""
+    chunk = []
+
+    async for element in aiterable:
+        chunk.append(element)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk